@@ -0,0 +1,69 @@
+import hashlib
+import os
+import sqlite3
+from typing import Dict, Optional, Union
+
+
+def hash_fields(*fields: str) -> str:
+    """SHA-256 over length-prefixed fields so ("ab", "c") and ("a", "bc") never collide."""
+    digest = hashlib.sha256()
+    for field in fields:
+        data = str(field).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class CompanyCache:
+    """SQLite-backed company summary cache keyed by SHA-256(company_name, website).
+
+    All entries are read into memory once on open; new entries are buffered and
+    written back in a single transaction by `flush()`/`close()`.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike] = "company_cache.sqlite"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS companies (key TEXT PRIMARY KEY, summary TEXT)"
+        )
+        self.conn.commit()
+        self.entries: Dict[str, str] = dict(
+            self.conn.execute("SELECT key, summary FROM companies")
+        )
+        self.pending: Dict[str, str] = {}
+
+    @staticmethod
+    def make_key(company_name: str, website: str) -> str:
+        return hash_fields(company_name, website)
+
+    def get(self, company_name: str, website: str) -> Optional[str]:
+        """Return the cached summary, or None on a miss"""
+        return self.entries.get(self.make_key(company_name, website))
+
+    def put(self, company_name: str, website: str, summary: str) -> None:
+        """Cache a company summary; it is persisted on the next flush"""
+        key = self.make_key(company_name, website)
+        self.entries[key] = summary
+        self.pending[key] = summary
+
+    def flush(self) -> None:
+        """Write all buffered entries in one transaction"""
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO companies (key, summary) VALUES (?, ?)",
+                self.pending.items(),
+            )
+        self.pending.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def close(self) -> None:
+        """Flush pending entries and close the database; safe to call more than once"""
+        if self.conn is None:
+            return
+        self.flush()
+        self.conn.close()
+        self.conn = None
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+from cache import hash_fields
+
+# Cached responses older than this are treated as misses
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class LLMCache:
+    """SQLite-backed prompt -> LLM response cache keyed by SHA-256 of the request.
+
+    The connection may be used from worker threads (e.g. via asyncio.to_thread);
+    access is serialized with a lock.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike] = "llm_cache.sqlite", ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, response TEXT, created_at INTEGER)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        return hash_fields(model, prompt, str(temperature), str(max_tokens))
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response if present and not expired"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at >= ?",
+                (key, int(time.time()) - self.ttl_seconds),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response, replacing any previous entry for the key"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, int(time.time())),
+            )
+            self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
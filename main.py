@@ -1,14 +1,24 @@
 import os
+import argparse
+import atexit
+import csv
+import functools
+import hashlib
 import pandas as pd
 import asyncio
 from dotenv import load_dotenv
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BrowserConfig, LLMConfig, CacheMode
-import h
-from serpapi import GoogleSearch
+from openai import AsyncOpenAI
+import aiohttp
 import json
+import re
+import tempfile
+import threading
 from crawl4ai.extraction_strategy import LLMExtractionStrategy, JsonCssExtractionStrategy
 from pydantic import BaseModel, Field
 from pathlib import Path
+from cache import CompanyCache
+from llm_cache import LLMCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,40 +27,36 @@ load_dotenv()
 class CompanySummary(BaseModel):
     summary: str = Field(description="A concise 2-3 line summary of what the company does, who they are, and what they're looking for")
 
-# Company caching functions
-def load_company_cache():
-    """Load company cache from file"""
-    cache_file = "company_cache.txt"
-    cache = {}
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if '|||' in line:
-                    company_name, summary = line.strip().split('|||', 1)
-                    cache[company_name] = summary
-    return cache
-
-def save_company_cache(cache):
-    """Save company cache to file"""
-    cache_file = "company_cache.txt"
-    with open(cache_file, 'w', encoding='utf-8') as f:
-        for company_name, summary in cache.items():
-            f.write(f"{company_name}|||{summary}\n")
+# Cache files live next to this script so runs from any working directory share them
+HERE = Path(__file__).resolve().parent
+SCHEMA_PATH = HERE / "extraction_schema.json"
+CACHE_PATH = HERE / "company_cache.sqlite"
+LLM_CACHE_PATH = HERE / "llm_cache.sqlite"
+
+def atomic_write(path, data):
+    """Writes text to a temp file in the same directory and renames it over `path`,
+    so an interrupted write never leaves a truncated file behind."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 # Schema caching functions
 def load_extraction_schema():
     """Load extraction schema from file"""
-    schema_file = "extraction_schema.json"
-    if os.path.exists(schema_file):
-        with open(schema_file, 'r') as f:
-            return json.load(f)
+    if SCHEMA_PATH.exists():
+        return json.loads(SCHEMA_PATH.read_text(encoding="utf-8"))
     return None
 
 def save_extraction_schema(schema):
     """Save extraction schema to file"""
-    schema_file = "extraction_schema.json"
-    with open(schema_file, 'w') as f:
-        json.dump(schema, f, indent=2)
+    atomic_write(SCHEMA_PATH, json.dumps(schema, separators=(",", ":")))
+
+SERPAPI_URL = "https://serpapi.com/search.json"
 
 serpapi_params = {
     "engine": "google",
@@ -58,14 +64,15 @@ serpapi_params = {
 }
 
 
-def get_linkedin_snippet(query: str):
-   """Get LinkedIn profile snippet from SERP API search results."""
-   search = GoogleSearch({
+async def get_linkedin_snippet(query: str, session: aiohttp.ClientSession):
+   """Get LinkedIn profile snippet from SERP API search results for a full `site:linkedin.com/in` query."""
+   params = {
        **serpapi_params,
-       "q": f"site:linkedin.com/in {query}",
+       "q": query,
        "num": 3
-   })
-   results_dict = search.get_dict()
+   }
+   async with session.get(SERPAPI_URL, params=params) as response:
+       results_dict = await response.json()
    if 'organic_results' in results_dict:
        results = results_dict["organic_results"]
    else:
@@ -86,26 +93,51 @@ def get_linkedin_snippet(query: str):
 FIREWORKS_API_KEY = os.getenv("FIREWORKS_API_KEY")
 #SERP_API_KEY = os.getenv("SERP_API_KEY") # This will be used later
 
-# Initialize Fireworks AI client
-fireworks.client.api_key = os.getenv("FIREWORKS_API_KEY")
+# Fireworks serves an OpenAI-compatible API; one async client is shared by all rows
+FIREWORKS_BASE_URL = "https://api.fireworks.ai/inference/v1"
+
+
+@functools.lru_cache(maxsize=1)
+def get_llm_client():
+    """Returns the shared async Fireworks client, created on first use."""
+    return AsyncOpenAI(base_url=FIREWORKS_BASE_URL, api_key=FIREWORKS_API_KEY)
+
+
+# Maximum number of rows scraped/generated at the same time
+MAX_CONCURRENCY = 10
+
+# Extracts the LinkedIn request and email from the LLM output in one pass
+PARSE_RE = re.compile(r"LINKEDIN_REQUEST_START(.*?)LINKEDIN_REQUEST_END.*?EMAIL_START(.*?)EMAIL_END", re.DOTALL)
+
+# Input text columns converted to pyarrow-backed strings on load
+STRING_COLUMNS = ["Company Name", "Website", "Lead Linkedin", "Lead Title", "Job Title", "First Name", "Last Name"]
+
+# Columns handed to process_row, in unpacking order (missing optional columns become NaN)
+ROW_COLUMNS = ["Website", "Company Name", "Lead Title", "Job Title", "First Name", "Last Name", "lead_info"]
+
+# Working columns added to the DataFrame that are not part of the output
+HELPER_COLUMNS = ["linkedin_id", "serp_q", "lead_info"]
+
+# LLM settings for outreach generation (also part of the response cache key).
+# The LinkedIn request plus a short email fit well within 400 tokens, and
+# temperature 0 keeps output deterministic so cached responses stay valid.
+LLM_MODEL = "accounts/fireworks/models/gpt-oss-120b"
+LLM_MAX_TOKENS = 400
+LLM_TEMPERATURE = 0
 
 def get_prompt(resume, lead_title, company_name, job_title, scraped_content):
-    """Generates the prompt for the LLM."""
+    """Generates the prompt for the LLM.
+
+    The resume and instructions come first and are identical for every row, so the
+    provider can reuse them as a cached prefix; per-row details follow at the end.
+    """
     return f"""
 My resume is:
 ---
 {resume}
 ---
 
-I am applying for the {job_title} position at {company_name}.
-The hiring manager is the {lead_title}.
-
-Here is some information I found about the company and the hiring manager:
----
-{scraped_content}
----
-
-Based on all this information, please generate:
+Using my resume and the details below, please generate:
 1. A personalized and concise LinkedIn connection request (max 300 characters).
 2. A personalized and compelling cold email to the hiring manager.
 
@@ -118,186 +150,387 @@ EMAIL_START
 Subject: [Your generated email subject here]
 [Your generated email body here]
 EMAIL_END
+
+I am applying for the {job_title} position at {company_name}.
+The hiring manager is the {lead_title}.
+
+Here is some information I found about the company and the hiring manager:
+---
+{scraped_content}
+---
+"""
+
+def get_resume_compaction_prompt(resume):
+    """Generates the one-off prompt that condenses the resume for reuse in every row."""
+    return f"""
+Condense the resume below into a compact profile of at most 150 words.
+Keep skills, roles, employers and measurable achievements; drop contact details and filler.
+Return only the condensed profile.
+---
+{resume}
+---
 """
 
-async def scrape_url(url):
-    """Scrapes the content of a single URL using schema-based extraction."""
+
+# Crawl configuration is identical for every URL, so it is built once per process
+COMPANY_SUMMARY_SCHEMA = CompanySummary.model_json_schema()
+# Example output shape for JsonCssExtractionStrategy.generate_schema
+SUMMARY_JSON_EXAMPLE = json.dumps({"summary": "A concise 2-3 line summary of what the company does."})
+SCRAPE_LLM_CONFIG = LLMConfig(provider="fireworks_ai/accounts/fireworks/models/gpt-oss-120b", api_token=FIREWORKS_API_KEY)
+
+@functools.lru_cache(maxsize=None)
+def get_llm_run_config(cache_mode):
+    """Builds the LLM schema-generation crawl config once per cache mode."""
+    return CrawlerRunConfig(
+        extraction_strategy=LLMExtractionStrategy(
+            llm_config=SCRAPE_LLM_CONFIG,
+            extraction_type="schema",
+            schema=COMPANY_SUMMARY_SCHEMA,
+            instruction="Based on the company website content, extract a concise 2-3 line summary - what they do, who they are.",
+            apply_chunking=False,
+            input_format="markdown",
+            extra_args={"temperature": 0.1, "max_tokens": 200},
+        ),
+        cache_mode=cache_mode,
+        remove_overlay_elements=True,
+        remove_forms=True,
+        only_text=True
+    )
+
+
+# Serializes the one-time schema generation across concurrent scrapes.
+# Created on first use so it binds to the running event loop (Python < 3.10).
+_schema_lock = None
+
+def get_schema_lock():
+    global _schema_lock
+    if _schema_lock is None:
+        _schema_lock = asyncio.Lock()
+    return _schema_lock
+
+@functools.lru_cache(maxsize=None)
+def get_css_run_config(cache_mode):
+    """Builds the CSS-schema crawl config once per cache mode; returns None until a schema has been generated."""
+    extraction_schema = load_extraction_schema()
+    if extraction_schema is None:
+        return None
+    return CrawlerRunConfig(
+        extraction_strategy=JsonCssExtractionStrategy(extraction_schema, verbose=False),
+        cache_mode=cache_mode,
+        remove_overlay_elements=True,
+        remove_forms=True,
+        only_text=True
+    )
+
+
+async def scrape_url(url, crawler, cache_mode=CacheMode.ENABLED):
+    """Scrapes the content of a single URL with a shared crawler using schema-based extraction.
+
+    With CacheMode.ENABLED, pages fetched on earlier runs are served from crawl4ai's local cache.
+    """
     if not url or not isinstance(url, str) or not url.startswith('http'):
         print(f"Skipping invalid URL: {url}")
         return ""
     print(f"Scraping URL: {url}")
     
     try:
-        # Load existing schema or generate new one
-        extraction_schema = load_extraction_schema()
-        
-        if extraction_schema is None:
-            print("No cached schema found. Generating new schema (one-time LLM cost)...")
-            # Generate schema using LLM (one-time cost)
-            llm_strategy = LLMExtractionStrategy(
-                llm_config=LLMConfig(provider="fireworks_ai/accounts/fireworks/models/gpt-oss-120b", api_token=FIREWORKS_API_KEY),
-                extraction_type="schema",
-                schema=CompanySummary.model_json_schema(),
-                instruction="Based on the company website content, extract a concise 2-3 line summary - what they do, who they are.",
-                chunk_token_threshold=1000,
-                overlap_rate=0.1,
-                apply_chunking=False,
-                input_format="markdown",
-                extra_args={"temperature": 0.1, "max_tokens": 200},
-            )
-            
-            config = CrawlerRunConfig(
-                extraction_strategy=llm_strategy,
-                cache_mode=CacheMode.BYPASS,  # Smart content filtering
-                remove_overlay_elements=True,
-                remove_forms=True,
-                only_text=True
-            )
-            
-            async with AsyncWebCrawler(config=BrowserConfig(headless=True)) as crawler:
-                result = await crawler.arun(url=url, config=config)
-                if result.success and result.extracted_content:
-                    # Generate CSS schema for future use
-                    css_schema = 
-                    .generate_css_schema(
-                        html=result.page_content,
-                        schema=CompanySummary.model_json_schema(),
-                        llm_config=LLMConfig(provider="fireworks_ai/accounts/fireworks/models/gpt-oss-120b", api_token=FIREWORKS_API_KEY)
-                    )
-                    save_extraction_schema(css_schema)
-                    print("✅ Schema generated and cached for future use!")
-                    
-                    # Return current result
-                    content_data = json.loads(result.extracted_content)
-                    if isinstance(content_data, dict) and "summary" in content_data:
-                        return content_data["summary"]
-                    return "No summary extracted"
-                else:
-                    print(f"Failed to generate schema from {url}")
-                    return ""
+        # Use the cached CSS schema when there is one, otherwise generate it
+        css_config = await asyncio.to_thread(get_css_run_config, cache_mode)
+
+        if css_config is None:
+            # Only one scrape generates the schema; the others wait for it and then use it
+            async with get_schema_lock():
+                css_config = await asyncio.to_thread(get_css_run_config, cache_mode)
+                if css_config is None:
+                    print("No cached schema found. Generating new schema (one-time LLM cost)...")
+                    # Generate schema using LLM (one-time cost)
+                    result = await crawler.arun(url=url, config=get_llm_run_config(cache_mode))
+                    if result.success and result.extracted_content:
+                        # Generate CSS schema for future use
+                        css_schema = await asyncio.to_thread(
+                            JsonCssExtractionStrategy.generate_schema,
+                            html=result.cleaned_html,
+                            query="Extract a concise 2-3 line summary of what the company does and who they are.",
+                            target_json_example=SUMMARY_JSON_EXAMPLE,
+                            llm_config=SCRAPE_LLM_CONFIG
+                        )
+                        await asyncio.to_thread(save_extraction_schema, css_schema)
+                        get_css_run_config.cache_clear()
+                        print("✅ Schema generated and cached for future use!")
+
+                        # Return current result
+                        content_data = json.loads(result.extracted_content)
+                        if isinstance(content_data, dict) and "summary" in content_data:
+                            return content_data["summary"]
+                        return "No summary extracted"
+                    else:
+                        print(f"Failed to generate schema from {url}")
+                        return ""
+
+        print("Using cached CSS schema (FREE extraction)...")
+        result = await crawler.arun(url=url, config=css_config)
+        if result.success and result.extracted_content:
+            content_data = json.loads(result.extracted_content)
+            print(f"✅ FREE extraction from {url}")
+            if isinstance(content_data, dict) and "summary" in content_data:
+                return content_data["summary"]
+            elif isinstance(content_data, list) and content_data:
+                if isinstance(content_data[0], dict) and "summary" in content_data[0]:
+                    return content_data[0]["summary"]
+            return "No summary extracted"
         else:
-            print("Using cached CSS schema (FREE extraction)...")
-            # Use cached CSS schema (FREE!)
-            css_strategy = JsonCssExtractionStrategy(extraction_schema, verbose=True)
-            
-            config = CrawlerRunConfig(
-                extraction_strategy=css_strategy,
-                cache_mode=CacheMode.BYPASS,
-                remove_overlay_elements=True,
-                remove_forms=True,
-                only_text=True
-            )
-            
-            async with AsyncWebCrawler(config=BrowserConfig(headless=True)) as crawler:
-                result = await crawler.arun(url=url, config=config)
-                if result.success and result.extracted_content:
-                    content_data = json.loads(result.extracted_content)
-                    print(f"✅ FREE extraction from {url}")
-                    if isinstance(content_data, dict) and "summary" in content_data:
-                        return content_data["summary"]
-                    elif isinstance(content_data, list) and content_data:
-                        if isinstance(content_data[0], dict) and "summary" in content_data[0]:
-                            return content_data[0]["summary"]
-                    return "No summary extracted"
-                else:
-                    print(f"CSS extraction failed for {url}")
-                    return ""
-                    
+            print(f"CSS extraction failed for {url}")
+            return ""
+                
     except Exception as e:
         print(f"An error occurred while scraping {url}: {e}")
         return ""
 
 
-async def main():
-    # Configurable paths
-    INPUT_FILE = "S:/Portfolio/ColdEmailGenerator/Companies_Hiring_Tech_Roles.xlsx"  # Replace with your actual Excel file path
-    RESUME_FILE = "S:/Portfolio/ColdEmailGenerator/Resumeforcoldemail.txt"  # Replace with your actual resume file path
-
-    # 1. Read input files
+async def scrape_missing_companies(df, company_cache, crawler, sem, cache_mode=CacheMode.ENABLED):
+    """Scrapes every uncached website exactly once, concurrently, and stores the summaries in the cache."""
+    companies = df[["Company Name", "Website"]].drop_duplicates()
+    missing = [
+        (company_name, website)
+        for company_name, website in companies.itertuples(index=False, name=None)
+        if company_cache.get(company_name, website) is None
+    ]
+    unique_sites = list(dict.fromkeys(website for _, website in missing if isinstance(website, str)))
+    print(f"Scraping {len(unique_sites)} unique websites for {len(missing)} uncached companies")
+
+    async def scrape(url):
+        async with sem:
+            return await scrape_url(url, crawler, cache_mode)
+
+    summaries = dict(zip(unique_sites, await asyncio.gather(*(scrape(url) for url in unique_sites))))
+    for company_name, website in missing:
+        company_info = summaries.get(website)
+        if company_info and company_info != "No summary extracted":
+            company_cache.put(company_name, website, company_info)
+
+
+async def fetch_lead_info(df, session, sem):
+    """Runs each distinct LinkedIn query once, concurrently, and returns the snippets aligned to df."""
+    queries = [query for query in df["serp_q"].unique() if isinstance(query, str) and query]
+    print(f"Fetching LinkedIn snippets for {len(queries)} unique queries")
+
+    async def search(query):
+        async with sem:
+            return await get_linkedin_snippet(query, session)
+
+    snippets = {}
+    for query, result in zip(queries, await asyncio.gather(*(search(query) for query in queries), return_exceptions=True)):
+        if isinstance(result, Exception):
+            print(f"LinkedIn search failed for '{query}': {result}")
+            continue
+        snippets[query] = result
+    return df["serp_q"].map(snippets).fillna("")
+
+
+class ResultStream:
+    """Thread-safe buffered CSV appender for generated rows, flushed every `flush_every` rows."""
+
+    HEADER = ["Row", "Company Name", "LinkedIn Request", "Cold Email"]
+
+    def __init__(self, path, flush_every=10):
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", buffering=1 << 20, encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.flush_every = flush_every
+        self.pending = 0
+        self.lock = threading.Lock()
+        if is_new:
+            self.writer.writerow(self.HEADER)
+
+    def write(self, row):
+        with self.lock:
+            self.writer.writerow(row)
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self.file.flush()
+                self.pending = 0
+
+    def close(self):
+        self.file.close()
+
+
+async def generate_text(prompt, llm_cache=None):
+    """Calls the LLM, serving identical requests from the response cache when enabled."""
+    key = LLMCache.make_key(LLM_MODEL, prompt, LLM_TEMPERATURE, LLM_MAX_TOKENS)
+    if llm_cache is not None and (cached := await asyncio.to_thread(llm_cache.get, key)) is not None:
+        print("Using cached LLM response")
+        return cached
+
+    response = await get_llm_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=LLM_MAX_TOKENS,
+        temperature=LLM_TEMPERATURE,
+    )
+    generated_text = response.choices[0].message.content
+    if llm_cache is not None:
+        await asyncio.to_thread(llm_cache.put, key, generated_text)
+    return generated_text
+
+
+async def compact_resume(resume_content, llm_cache=None):
+    """Returns a condensed resume, generated once per resume version and stored next to the script."""
+    resume_hash = hashlib.sha256(resume_content.encode("utf-8")).hexdigest()[:12]
+    compact_path = HERE / f"resume_compact_{resume_hash}.txt"
+    if compact_path.exists():
+        return await asyncio.to_thread(compact_path.read_text, encoding="utf-8")
+
+    print("Condensing resume (one-time LLM cost per resume version)...")
     try:
-        df = pd.read_excel(INPUT_FILE)
-        df.describe()
-        with open(RESUME_FILE, "r") as f:
-            resume_content = f.read()
-    except FileNotFoundError as e:
-        print(f"Error: {e}")
-        return
-
-    # Load company cache
-    company_cache = load_company_cache()
-    print(f"Loaded {len(company_cache)} companies from cache")
-
-    # Add new columns for generated content
-    df["LinkedIn Request"] = ""
-    df["Cold Email"] = ""
-
-    # 2. Process each row
-    for index, row in df.iterrows():
-        lead_linkedin = row.get("Lead Linkedin")
-        company_website = row.get("Website")
-        company_name = row.get("Company Name")
-
-        # Extract LinkedIn ID
-        linkedin_id = lead_linkedin.split("/in/")[-1] if "/in/" in lead_linkedin else ""
-
-        # 3. Get LinkedIn snippet (no crawling)
-        lead_info = get_linkedin_snippet(f"{linkedin_id} {company_name}") if linkedin_id else ""
+        compact = (await generate_text(get_resume_compaction_prompt(resume_content), llm_cache)).strip()
+    except Exception as e:
+        print(f"Could not condense resume, using it in full: {e}")
+        return resume_content
+    if not compact:
+        return resume_content
+    await asyncio.to_thread(atomic_write, compact_path, compact)
+    return compact
+
+
+async def process_row(row, resume_content, company_cache, llm_cache, result_stream, sem):
+    """Generates content for a single (index, *ROW_COLUMNS) tuple; returns (linkedin_request, email) or None."""
+    index, company_website, company_name, lead_title, job_title, first_name, last_name, lead_info = row
+    async with sem:
+        # 3. Get LinkedIn snippet (fetched up front by fetch_lead_info)
+        lead_info = lead_info or ""
         print("Lead info is", lead_info)
 
-        # 4. Get company info (with caching)
-        if company_name in company_cache:
-            print(f"Using cached info for {company_name}")
-            company_info = company_cache[company_name]
-        else:
-            print(f"Scraping new company: {company_name}")
-            company_info = await scrape_url(company_website)
-            if company_info and company_info != "No summary extracted":
-                company_cache[company_name] = company_info
-                save_company_cache(company_cache)  # Save immediately
-        
+        # 4. Get company info (scraped up front by scrape_missing_companies)
+        company_info = company_cache.get(company_name, company_website) or ""
+
         print("Company info is", company_info)
         combined_scraped_text = "\n".join(filter(None, [lead_info, company_info]))
         print("Combined scraped text is", combined_scraped_text)
 
         if not combined_scraped_text:
             print(f"No content scraped for row {index}. Skipping LLM generation.")
-            continue
+            return None
 
         # 4. Generate content with LLM
         prompt = get_prompt(
             resume=resume_content,
-            lead_title=row.get("Lead Title"),
-            company_name=row.get("Company Name"),
-            job_title=row.get("Job Title"),
+            lead_title=lead_title,
+            company_name=company_name,
+            job_title=job_title,
             scraped_content=combined_scraped_text
         )
 
         try:
-            print(f"Generating content for {row.get('First Name')} {row.get('Last Name')}...")
-            response = fireworks.client.ChatCompletion.create(
-                model="accounts/fireworks/models/gpt-oss-120b",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1024,
-                temperature=0.7,
-            )
-            generated_text = response.choices[0].message.content
+            print(f"Generating content for {first_name} {last_name}...")
+            generated_text = await generate_text(prompt, llm_cache)
 
             # 5. Parse the generated text
-            linkedin_request = generated_text.split("LINKEDIN_REQUEST_START")[1].split("LINKEDIN_REQUEST_END")[0].strip()
-            email_full = generated_text.split("EMAIL_START")[1].split("EMAIL_END")[0].strip()
+            match = PARSE_RE.search(generated_text)
+            if not match:
+                print(f"Could not parse generated content for row {index}. Skipping.")
+                return None
+            linkedin_request, email_full = match.group(1).strip(), match.group(2).strip()
 
-            df.at[index, "LinkedIn Request"] = linkedin_request
-            df.at[index, "Cold Email"] = email_full
+            await asyncio.to_thread(result_stream.write, [index, company_name, linkedin_request, email_full])
             print(f"Successfully generated content for row {index}.")
+            return linkedin_request, email_full
 
         except Exception as e:
             print(f"Error generating content for row {index}: {e}")
+            return None
+
+
+def read_leads(path):
+    """Reads the lead list from Parquet or Excel depending on the file extension.
+
+    Text columns are stored as pyarrow-backed strings for faster `.str` operations.
+    """
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_excel(path, engine="openpyxl")
+    return df.astype({column: "string[pyarrow]" for column in STRING_COLUMNS if column in df.columns})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate LinkedIn requests and cold emails from an Excel lead list.")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the LLM instead of reusing cached responses")
+    parser.add_argument("--refresh", action="store_true", help="Bypass crawl4ai's page cache and re-fetch every website")
+    parser.add_argument("--excel-out", metavar="PATH", help="Also write the final output as an Excel file")
+    return parser.parse_args()
+
+
+async def main(args):
+    # Configurable paths
+    INPUT_FILE = "S:/Portfolio/ColdEmailGenerator/Companies_Hiring_Tech_Roles.xlsx"  # Replace with your actual Excel file path
+    RESUME_FILE = "S:/Portfolio/ColdEmailGenerator/Resumeforcoldemail.txt"  # Replace with your actual resume file path
+    OUTPUT_FILE = "output.parquet"
+    STREAM_FILE = "output.csv"  # Rows are appended here as they finish, so a crash keeps finished work
+
+    # 1. Read input files
+    try:
+        df = read_leads(INPUT_FILE)
+        with open(RESUME_FILE, "r") as f:
+            resume_content = f.read()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return
+
+    # Load company cache
+    company_cache = CompanyCache(CACHE_PATH)
+    atexit.register(company_cache.close)  # Persist new summaries even if the run is interrupted
+    print(f"Loaded {len(company_cache)} companies from cache")
+    llm_cache = None if args.no_cache else LLMCache(LLM_CACHE_PATH)
+
+    # Extract LinkedIn IDs and build the SerpAPI queries for all rows at once
+    df["linkedin_id"] = df["Lead Linkedin"].astype("string").str.extract(r"/in/([^/?#]+)", expand=False).fillna("")
+    df["serp_q"] = ("site:linkedin.com/in " + df["linkedin_id"] + " " + df["Company Name"].astype("string").fillna("")).where(df["linkedin_id"] != "", "")
+
+    # Condense the resume once; every prompt embeds the compact form
+    resume_content = await compact_resume(resume_content, llm_cache)
+
+    # Generated rows are appended to the CSV as soon as they are ready
+    result_stream = ResultStream(STREAM_FILE)
+
+    # 2. Scrape companies and fetch LinkedIn snippets for all rows up front, sharing one
+    # browser and one keep-alive HTTP session, then generate content per row.
+    # Everything is bounded by a shared semaphore.
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=10)
+    async with AsyncWebCrawler(config=BrowserConfig(headless=True)) as crawler, \
+            aiohttp.ClientSession(connector=connector) as session:
+        cache_mode = CacheMode.BYPASS if args.refresh else CacheMode.ENABLED
+        _, df["lead_info"] = await asyncio.gather(
+            scrape_missing_companies(df, company_cache, crawler, sem, cache_mode),
+            fetch_lead_info(df, session, sem),
+        )
 
-    # 6. Save output and cache
-    df.to_excel("output.xlsx", index=False)
-    save_company_cache(company_cache)  # Final cache save
-    print("Processing complete. Output saved to output.xlsx")
+    rows = df.reindex(columns=ROW_COLUMNS).itertuples(index=True, name=None)
+    tasks = [process_row(row, resume_content, company_cache, llm_cache, result_stream, sem) for row in rows]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    result_stream.close()
+
+    for index, result in zip(df.index, results):
+        if isinstance(result, Exception):
+            print(f"Error processing row {index}: {result}")
+    generated = [result if isinstance(result, tuple) else ("", "") for result in results]
+    df["LinkedIn Request"] = [linkedin_request for linkedin_request, _ in generated]
+    df["Cold Email"] = [email_full for _, email_full in generated]
+
+    # 6. Save output and close cache
+    df = df.drop(columns=HELPER_COLUMNS)
+    df.to_parquet(OUTPUT_FILE, compression="zstd", index=False)
+    print(f"Processing complete. Output saved to {OUTPUT_FILE}")
+    if args.excel_out:
+        df.to_excel(args.excel_out, index=False)
+        print(f"Excel copy saved to {args.excel_out}")
     print(f"Company cache updated with {len(company_cache)} companies")
+    company_cache.close()
+    if llm_cache is not None:
+        llm_cache.close()
+    if get_llm_client.cache_info().currsize:
+        await get_llm_client().close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
@@ -1,20 +1,32 @@
 import os
 import pandas as pd 
+import pyarrow as pa
+import pyarrow.parquet as pq
 import asyncio
 import logging
 from dotenv import load_dotenv
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BrowserConfig, LLMConfig, CacheMode
-import fireworks.client
-from serpapi import GoogleSearch
-import json
+import httpx
+from bs4 import BeautifulSoup
+from aiolimiter import AsyncLimiter
+import orjson
 from crawl4ai.extraction_strategy import LLMExtractionStrategy
 from pydantic import BaseModel, Field
 from pathlib import Path
 import time
-import backoff
-from typing import Optional, Dict, List
+import hashlib
+import sqlite3
+import random
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, List, Union
 from datetime import datetime
+import textwrap
 import re
+from urllib.parse import urlsplit
 
 # Load environment variables from .env file
 load_dotenv()
@@ -39,10 +51,200 @@ logger = logging.getLogger(__name__)
 logger.info("=== LOGGING INITIALIZED ===")
 # print(f"Log file exists: {os.path.exists(log_file)}")
 
+# REST endpoints, called through one pooled httpx.AsyncClient
+SERPAPI_URL = "https://serpapi.com/search.json"
+FIREWORKS_CHAT_URL = "https://api.fireworks.ai/inference/v1/chat/completions"
+
+# Retries for SerpAPI/Fireworks calls (decorrelated jitter, seconds)
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Company summaries and LLM responses; main.py's company_cache.sqlite uses a different schema
+COMPANY_CACHE_DB = "outreach_cache.sqlite"
+LEGACY_CACHE_FILE = "company_cache.txt"
+
+# Seconds before a single page scrape is abandoned
+SCRAPE_TIMEOUT = 45
+
+# Plain-GET fast path: a page description at least this many words long skips the browser + LLM
+FAST_SCRAPE_MIN_WORDS = 15
+FAST_SCRAPE_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; ColdEmailGenerator)"}
+
+# Threads for blocking SQLite, file and parsing work
+IO_POOL_WORKERS = 32
+
+# Input columns read by process_row
+ROW_COLUMNS = ["First Name", "Last Name", "Company Name", "Website", "Lead Title", "Job Title", "Lead Linkedin"]
+
+# Rows between progress checkpoints
+PROGRESS_SAVE_EVERY = 5
+# Each checkpoint is its own complete Parquet file in a per-run progress_<timestamp> directory
+# next to the output, so it stays readable after a crash and later runs never overwrite it
+PROGRESS_DIR_PREFIX = "progress_"
+PROGRESS_SCHEMA = pa.schema([
+    ("Row", pa.int64()),
+    ("First Name", pa.string()),
+    ("Last Name", pa.string()),
+    ("Company Name", pa.string()),
+    ("LinkedIn Request", pa.string()),
+    ("Cold Email", pa.string()),
+    ("Processing Status", pa.string()),
+    ("Processed At", pa.timestamp("s", tz="UTC")),
+])
+
+# Generation settings; responses are only cached when generation is deterministic
+LLM_MODEL = "accounts/fireworks/models/deepseek-v3"
+LLM_MAX_TOKENS = 400
+LLM_TEMPERATURE = 0
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Leads packed into one generation request, and how long to wait for a batch to fill
+GENERATION_BATCH_SIZE = 4
+GENERATION_BATCH_WINDOW = 0.2
+
+# Instructions identical for every row; sent first so the provider can reuse its prompt cache
+OUTREACH_INSTRUCTIONS = """Write personalized outreach for the contact described by the user.
+
+Write:
+1. LinkedIn request (<300 chars, reference their work)
+2. Cold email (subject + 150-200 words, personalized)
+
+Format:
+LINKEDIN_REQUEST_START
+[request text]
+LINKEDIN_REQUEST_END
+
+EMAIL_START
+Subject: [subject]
+
+[email body]
+EMAIL_END"""
+
+# Literal sentinels the prompt asks the model to wrap each output in
+_LINKEDIN_MARKERS = ("LINKEDIN_REQUEST_START", "LINKEDIN_REQUEST_END")
+_EMAIL_MARKERS = ("EMAIL_START", "EMAIL_END")
+
+def _between(text: str, start: str, end: str) -> Optional[str]:
+    """Return the stripped text between two markers, or None if either is missing"""
+    i = text.find(start)
+    if i == -1:
+        return None
+    i += len(start)
+    j = text.find(end, i)
+    if j == -1:
+        return None
+    return text[i:j].strip()
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After or X-RateLimit-Reset"""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError, AttributeError):
+                pass
+    reset = response.headers.get("X-RateLimit-Reset")
+    if reset:
+        try:
+            value = float(reset)
+        except ValueError:
+            return None
+        # Either an epoch timestamp or a number of seconds
+        return max(0.0, value - time.time()) if value > 1e9 else value
+    return None
+
+_COMPANY_SUFFIX_RE = re.compile(r"\b(inc|llc|ltd|corp|co|gmbh|plc)\b")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]")
+
+def _write_progress_part(progress_dir: str, table: pa.Table, part: int) -> None:
+    """Atomically write one checkpoint as <progress_dir>/part-NNNNN.parquet"""
+    path = os.path.join(progress_dir, f"part-{part:05d}.parquet")
+    # Leading underscore: Parquet dataset readers skip the file while it is being written
+    tmp_path = os.path.join(progress_dir, f"_part-{part:05d}.parquet.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+def _canon_company(name: str) -> str:
+    """Canonical company name: lowercase, legal suffixes and punctuation removed"""
+    lowered = name.lower().strip()
+    return _NON_ALNUM_RE.sub("", _COMPANY_SUFFIX_RE.sub("", lowered)) or lowered
+
+def _canon_url(url: str) -> str:
+    """Canonical website key: host without "www.", plus path; scheme, query and fragment dropped"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host + parts.path.rstrip("/")
+
+def _jsonld_descriptions(soup: BeautifulSoup) -> List[str]:
+    """"description" strings from the page's JSON-LD blocks"""
+    descriptions = []
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = orjson.loads(script.string or "")
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get("@graph", [data]) if isinstance(data, dict) else []
+        for item in items:
+            if isinstance(item, dict) and isinstance(item.get("description"), str):
+                descriptions.append(item["description"].strip())
+    return descriptions
+
+def _page_description(html: str) -> Optional[str]:
+    """First meta / OpenGraph / JSON-LD description with at least FAST_SCRAPE_MIN_WORDS words"""
+    soup = BeautifulSoup(html, "lxml")
+    candidates = []
+    for attrs in ({"name": "description"}, {"property": "og:description"}):
+        tag = soup.find("meta", attrs=attrs)
+        if tag and tag.get("content"):
+            candidates.append(tag["content"].strip())
+    candidates.extend(_jsonld_descriptions(soup))
+    
+    for text in candidates:
+        if len(text.split()) >= FAST_SCRAPE_MIN_WORDS:
+            return text
+    return None
+
+def _load_leads(input_file: str) -> pd.DataFrame:
+    """Read the lead sheet. .parquet/.csv are read directly; a workbook is parsed with calamine
+    and a .parquet copy is kept beside it so re-runs skip the Excel parse until the workbook changes."""
+    if input_file.endswith(".parquet"):
+        return pd.read_parquet(input_file)
+    if input_file.endswith(".csv"):
+        return pd.read_csv(input_file)
+    
+    sidecar = input_file + ".parquet"
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(input_file):
+        return pd.read_parquet(sidecar)
+    df = pd.read_excel(input_file, engine="calamine")
+    try:
+        df.to_parquet(sidecar, index=False)
+    except Exception as e:
+        # e.g. a column mixing numbers and text; the next run just parses the workbook again
+        logger.warning(f"Could not write {sidecar}: {e}")
+    return df
+
+def build_system_message(resume: str) -> str:
+    """Static prompt prefix: instructions plus the (truncated) resume.
+    
+    Trailing whitespace is stripped so the prefix stays byte-identical across runs."""
+    # Truncate resume to first 500 characters to save tokens
+    resume = resume.strip()
+    resume_short = resume[:500] + "..." if len(resume) > 500 else resume
+    return f"{OUTREACH_INSTRUCTIONS}\n\nMY SKILLS: {resume_short}".rstrip()
+
 # Define schema for company summary extraction
 class CompanySummary(BaseModel):
     summary: str = Field(description="A concise 2-3 line summary of what the company does, who they are, and what they're looking for")
 
+COMPANY_SUMMARY_SCHEMA = CompanySummary.model_json_schema()
+
 class OutreachGenerator:
     def __init__(self):
         # print("  Initializing OutreachGenerator...")
@@ -57,84 +259,285 @@ class OutreachGenerator:
         # print("  ✅ API keys loaded")
             
         # print("  Setting up Fireworks client...")
-        # Initialize clients
-        fireworks.client.api_key = self.fireworks_api_key
+        # Initialize clients: one pooled HTTP client serves SerpAPI and Fireworks
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        )
         # print("  ✅ Fireworks client configured")
         
         # print("  Loading company cache...")
-        # Cache management
-        self.company_cache = self.load_company_cache()
-        # print(f"  ✅ Loaded {len(self.company_cache)} cached companies")
+        # Blocking work (SQLite, file IO, HTML parsing) runs here instead of on the event loop
+        self._io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="outreach-io")
+        
+        # Cache management: rows are read from SQLite on first use
+        self._db_lock = threading.Lock()
+        self._db = self._open_company_cache()
+        self._import_legacy_cache()
+        self._mem: Dict[bytes, str] = {}
+        
+        # Rate limiting: an async token bucket per external service
+        self._serp_limiter = AsyncLimiter(max_rate=5, time_period=1)
+        self._fw_limiter = AsyncLimiter(max_rate=30, time_period=1)
+        
+        # Company summary extraction; strategy and run config hold no per-URL state so one of each is shared
+        self._llm_strategy = LLMExtractionStrategy(
+            llm_config=LLMConfig(
+                provider="fireworks_ai/accounts/fireworks/models/deepseek-v3", 
+                api_token=self.fireworks_api_key
+            ),
+            extraction_type="schema",
+            schema=COMPANY_SUMMARY_SCHEMA,
+            instruction="Extract a concise 2-3 line company summary focusing on: what they do, their industry, and their focus.",
+            apply_chunking=False,
+            input_format="markdown",
+            extra_args={"temperature": 0.1, "max_tokens": 150},
+        )
+        self._crawl_cfg = CrawlerRunConfig(
+            extraction_strategy=self._llm_strategy,
+            cache_mode=CacheMode.BYPASS,
+            remove_overlay_elements=True,
+            remove_forms=True,
+            only_text=True,  # Focus on text content only
+            exclude_external_links=True,  # Remove external navigation
+            exclude_social_media_links=True,  # Remove social media buttons
+            #page_timeout=30000,  # 30 seconds timeout
+        )
+        # Started in __aenter__
+        self._browser: Optional[AsyncWebCrawler] = None
+        # Browser pages open at once; kept below max_concurrency so Chromium doesn't exhaust memory
+        self._scrape_sem = asyncio.Semaphore(int(os.getenv("SCRAPE_CONCURRENCY", "4")))
+        
+        # In-run scrapes keyed by canonical URL, so rows sharing a website scrape it once
+        self._url_tasks: Dict[str, asyncio.Task] = {}
         
-        # Rate limiting
-        self.last_api_call = 0
-        self.min_delay = 1.0  # Minimum delay between API calls
+        # System message shared by every row; built by set_resume()
+        self._system_message: Optional[Dict[str, str]] = None
+        self._system_digest = ""
         
-        logger.info(f"Initialized with {len(self.company_cache)} cached companies")
+        # Generation requests waiting to be batched; the worker starts in __aenter__
+        self._gen_queue: asyncio.Queue = asyncio.Queue()
+        self._gen_worker: Optional[asyncio.Task] = None
+        self._batch_tasks: set = set()
+        
+        # Monotonic time until which each host asked us to wait (Retry-After)
+        self._host_reset_at: Dict[str, float] = {}
+        
+        # Number of rows processed concurrently
+        self.max_concurrency = 16
+        
+        logger.info(f"Initialized with {self.cached_company_count()} cached companies")
 
-    # Caching methods with improved error handling
-    def load_company_cache(self) -> Dict[str, str]:
-        """Load company cache from file with error handling"""
-        cache_file = "company_cache.txt"
-        cache = {}
-        try:
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    for line_num, line in enumerate(f, 1):
-                        try:
-                            if '|||' in line:
-                                parts = line.strip().split('|||', 1)
-                                if len(parts) == 2:
-                                    company_name, summary = parts
-                                    cache[company_name.strip()] = summary.strip()
-                        except Exception as e:
-                            logger.warning(f"Error parsing cache line {line_num}: {e}")
-        except Exception as e:
-            logger.error(f"Error loading company cache: {e}")
-        return cache
+    async def __aenter__(self) -> "OutreachGenerator":
+        # One headless browser serves every scrape in the run
+        self._browser = AsyncWebCrawler(
+            config=BrowserConfig(headless=True, extra_args=["--disable-dev-shm-usage"])
+        )
+        await self._browser.__aenter__()
+        self._gen_worker = asyncio.create_task(self._generation_worker())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Stop batching and close the browser, the pooled HTTP client and the company cache"""
+        if self._gen_worker is not None:
+            self._gen_worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._gen_worker
+            self._gen_worker = None
+        if self._browser is not None:
+            await self._browser.__aexit__(None, None, None)
+            self._browser = None
+        await self._http.aclose()
+        self._io_pool.shutdown(wait=True)
+        self._db.close()
+
+    async def _run_io(self, func, *args):
+        """Run a blocking call on the IO thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_pool, functools.partial(func, *args))
+
+    # Caching methods: SQLite store keyed by SHA-256 of the normalized company name
+    def _open_company_cache(self) -> sqlite3.Connection:
+        """Open (and create if needed) the on-disk company and LLM response cache"""
+        # Used from _io_pool threads; every statement runs under _db_lock
+        db = sqlite3.connect(COMPANY_CACHE_DB, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS companies "
+            "(key BLOB PRIMARY KEY, name TEXT, summary TEXT, ts INTEGER, source TEXT)"
+        )
+        # Databases created before the source column existed
+        if "source" not in {row[1] for row in db.execute("PRAGMA table_info(companies)")}:
+            db.execute("ALTER TABLE companies ADD COLUMN source TEXT")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache "
+            "(key BLOB PRIMARY KEY, linkedin TEXT, email TEXT, ts INTEGER)"
+        )
+        return db
 
-    def save_company_cache(self) -> None:
-        """Save company cache to file with backup"""
-        cache_file = "company_cache.txt"
-        backup_file = "company_cache.backup.txt"
+    @staticmethod
+    def _company_key(company_name: str, website: str = "") -> Optional[bytes]:
+        """Cache key for a company; "Acme Inc." and "ACME, Inc" share an entry.
         
+        Leads without a company name are keyed by their canonical website; None if neither is known.
+        """
+        canon = _canon_company(company_name)
+        if not canon:
+            if not website:
+                return None
+            canon = "url:" + _canon_url(website)
+        return hashlib.sha256(canon.encode("utf-8")).digest()
+
+    def _import_legacy_cache(self) -> None:
+        """One-time import of the old company_cache.txt into an empty database"""
+        if not os.path.exists(LEGACY_CACHE_FILE):
+            return
+        if self._db.execute("SELECT 1 FROM companies LIMIT 1").fetchone():
+            return
+        rows = []
         try:
-            # Create backup of existing file
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-            
-            # Write new cache
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                for company_name, summary in self.company_cache.items():
-                    # Sanitize data to prevent parsing issues
-                    clean_company = company_name.replace('|||', '').strip()
-                    clean_summary = summary.replace('|||', '').strip()
-                    f.write(f"{clean_company}|||{clean_summary}\n")
-            logger.info(f"Saved {len(self.company_cache)} companies to cache")
+            with open(LEGACY_CACHE_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    company_name, sep, summary = line.strip().partition('|||')
+                    if sep and company_name.strip():
+                        rows.append((self._company_key(company_name), company_name.strip(), summary.strip(), int(time.time())))
         except Exception as e:
+            logger.error(f"Error importing {LEGACY_CACHE_FILE}: {e}")
+            return
+        self._db.executemany("INSERT OR REPLACE INTO companies (key, name, summary, ts) VALUES (?, ?, ?, ?)", rows)
+        logger.info(f"Imported {len(rows)} companies from {LEGACY_CACHE_FILE}")
+
+    def get_cached_company(self, company_name: str, website: str = "") -> Optional[str]:
+        """Return the cached summary for a company, reading the database only on a memory miss"""
+        key = self._company_key(company_name, website)
+        if key is None:
+            return None
+        if key not in self._mem:
+            with self._db_lock:
+                row = self._db.execute("SELECT summary FROM companies WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._mem[key] = row[0]
+        return self._mem[key]
+
+    def cache_company(self, company_name: str, summary: str, source: str, website: str = "") -> None:
+        """Persist one company summary with a single INSERT; source is "fast" or "llm" """
+        key = self._company_key(company_name, website)
+        if key is None:
+            return
+        self._mem[key] = summary
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO companies (key, name, summary, ts, source) VALUES (?, ?, ?, ?, ?)",
+                    (key, company_name.strip() or website.strip(), summary, int(time.time()), source),
+                )
+        except sqlite3.Error as e:
             logger.error(f"Error saving company cache: {e}")
 
+    def cached_company_count(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM companies").fetchone()[0]
+
+    def _prompt_key(self, user: str) -> bytes:
+        """Cache key for a generation request: the per-lead user message plus a digest of the
+        shared system prefix, so a changed resume or instruction set is still a miss."""
+        return hashlib.sha256(f"{LLM_MODEL}\0{LLM_MAX_TOKENS}\0{self._system_digest}\0{user}".encode("utf-8")).digest()
+
+    def _get_cached_content(self, key: bytes) -> Optional[tuple[str, str]]:
+        """Return a cached (linkedin_request, email) pair younger than the TTL"""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT linkedin, email FROM llm_cache WHERE key = ? AND ts > ?",
+                (key, int(time.time()) - LLM_CACHE_TTL_SECONDS),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _cache_content(self, key: bytes, linkedin_request: str, email_full: str) -> None:
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, linkedin, email, ts) VALUES (?, ?, ?, ?)",
+                    (key, linkedin_request, email_full, int(time.time())),
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error saving LLM cache: {e}")
+
+
+    async def _request(self, limiter: AsyncLimiter, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying transport errors and 429/5xx with decorrelated jitter.
+        
+        A server-provided Retry-After / X-RateLimit-Reset takes precedence over the jittered
+        delay and is shared with other coroutines calling the same host. Other HTTP errors
+        (401, 400, ...) are raised immediately.
+        """
+        host = httpx.URL(url).host
+        delay = RETRY_BASE_DELAY
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            # Don't call a host that already told us to back off
+            wait = self._host_reset_at.get(host, 0.0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            retry_after = None
+            try:
+                async with limiter:
+                    response = await self._http.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == RETRY_ATTEMPTS:
+                    raise
+                logger.warning(f"{method} {host} failed ({e!r}), attempt {attempt}/{RETRY_ATTEMPTS}")
+            else:
+                self._note_quota(host, response)
+                if response.status_code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS:
+                    response.raise_for_status()
+                    return response
+                retry_after = _retry_after_seconds(response)
+                logger.warning(f"{method} {host} returned {response.status_code}, attempt {attempt}/{RETRY_ATTEMPTS}")
+            
+            delay = min(RETRY_MAX_DELAY, random.uniform(RETRY_BASE_DELAY, delay * 3))
+            if retry_after is not None:
+                delay = retry_after
+                self._pause_host(host, retry_after)
+            await asyncio.sleep(delay)
+
+    def _pause_host(self, host: str, seconds: float) -> None:
+        """Hold every coroutine's next call to host for the given number of seconds"""
+        self._host_reset_at[host] = max(self._host_reset_at.get(host, 0.0), time.monotonic() + seconds)
+
+    def _note_quota(self, host: str, response: httpx.Response) -> None:
+        """Pause a host whose X-RateLimit-Remaining says the quota is used up, until it resets"""
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        try:
+            if float(remaining) > 0:
+                return
+        except ValueError:
+            return
+        reset = _retry_after_seconds(response)
+        if reset:
+            logger.info(f"{host} quota exhausted, pausing calls for {reset:.0f}s")
+            self._pause_host(host, reset)
 
-    @backoff.on_exception(backoff.expo, Exception, max_tries=3, max_time=60)
-    def get_person_info(self, query: str) -> str:
+    async def get_person_info(self, query: str) -> str:
         """Get person information from Google search with retry logic."""
         if not query.strip():
             return "No query provided."
             
         try:
-            # Rate limiting
-            self._apply_rate_limit()
-            
-            search = GoogleSearch({
+            response = await self._request(self._serp_limiter, "GET", SERPAPI_URL, params={
                 "engine": "google",
                 "api_key": self.serpapi_key,
                 "q": f"{query}",  # firstname lastname company - broader search
                 "num": 5
             })
-            
-            results_dict = search.get_dict()
+            results_dict = orjson.loads(response.content)
             
             if 'organic_results' not in results_dict:
                 logger.warning(f"No organic results found for LinkedIn search: {query}")
@@ -159,62 +562,68 @@ class OutreachGenerator:
             logger.error(f"Error getting LinkedIn snippet for {query}: {e}")
             raise
 
-    def _apply_rate_limit(self) -> None:
-        """Apply rate limiting between API calls"""
-        current_time = time.time()
-        time_since_last_call = current_time - self.last_api_call
-        
-        if time_since_last_call < self.min_delay:
-            sleep_time = self.min_delay - time_since_last_call
-            time.sleep(sleep_time)
-        
-        self.last_api_call = time.time()
-
-    def get_prompt(self, resume: str, lead_title: str, company_name: str, 
-                   job_title: str, person_info: str, company_info: str) -> str:
-        """Generate improved prompt for the LLM with better structure."""
-        # Truncate resume to first 500 characters to save tokens
-        resume_short = resume[:500] + "..." if len(resume) > 500 else resume
-        
-        prompt = f"""Create personalized outreach for {job_title} at {company_name}.
+    def set_resume(self, resume: str) -> None:
+        """Build the system message (and its cache digest) once per run"""
+        content = build_system_message(resume)
+        self._system_message = {"role": "system", "content": content}
+        self._system_digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
 
-MY SKILLS: {resume_short}
+    def get_user_message(self, lead_title: str, company_name: str, 
+                         job_title: str, person_info: str, company_info: str) -> str:
+        """Per-lead part of the prompt; everything shared across rows lives in the system message."""
+        return f"""Create personalized outreach for {job_title} at {company_name}.
 
 CONTACT: {lead_title}
 COMPANY: {company_info}
-PERSON: {person_info}
-
-Write:
-1. LinkedIn request (<300 chars, reference their work)
-2. Cold email (subject + 150-200 words, personalized)
-
-Format:
-LINKEDIN_REQUEST_START
-[request text]
-LINKEDIN_REQUEST_END
-
-EMAIL_START
-Subject: [subject]
-
-[email body]
-EMAIL_END"""
-        return prompt
+PERSON: {person_info}"""
 
-    @backoff.on_exception(backoff.expo, Exception, max_tries=3)
-    async def scrape_url(self, url: str) -> str:
-        """Enhanced URL scraping with better error handling and validation."""
+    async def scrape_url(self, url: str) -> tuple[str, str]:
+        """Enhanced URL scraping with better error handling and validation.
+        
+        Returns (summary, source): the page's own description when it is long enough
+        ("fast"), otherwise the browser + LLM extraction ("llm").
+        """
         if not self._is_valid_url(url):
             logger.warning(f"Invalid URL provided: {url}")
-            return ""
+            return "", ""
             
         logger.info(f"Scraping URL: {url}")
         
         try:
-            return await self._scrape_with_llm_strategy(url)
+            summary = await self._scrape_fast(url)
+            if summary:
+                logger.info(f"Using page description for {url}")
+                return summary, "fast"
+            
+            return await self._scrape_with_llm_strategy(url), "llm"
                 
         except Exception as e:
             logger.error(f"Error scraping {url}: {e}")
-            return ""
+            return "", ""
+
+    async def _scrape_fast(self, url: str) -> Optional[str]:
+        """Meta / OpenGraph / JSON-LD description from a plain GET, or None if too short to use"""
+        try:
+            response = await self._http.get(url, follow_redirects=True, timeout=10, headers=FAST_SCRAPE_HEADERS)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.debug(f"Fast scrape of {url} failed: {e}")
+            return None
+        
+        return await self._run_io(_page_description, response.text)
+
+    async def _scrape_once(self, company_name: str, url: str) -> tuple[str, str]:
+        """Scrape each canonical website at most once per run, sharing the result across rows"""
+        key = _canon_url(url)
+        task = self._url_tasks.get(key)
+        if task is None:
+            logger.info(f"Scraping new company: {company_name}")
+            task = asyncio.create_task(self.scrape_url(url))
+            self._url_tasks[key] = task
+        else:
+            logger.info(f"Reusing scrape of {key} for {company_name}")
+        # Shielded so one cancelled row doesn't cancel the scrape for the others
+        return await asyncio.shield(task)
 
     def _is_valid_url(self, url) -> bool:
         """Validate URL format"""
@@ -226,49 +635,28 @@ EMAIL_END"""
         """Scrape using LLM strategy"""
         logger.info("Using LLM strategy ")
         
-        llm_strategy = LLMExtractionStrategy(
-            llm_config=LLMConfig(
-                provider="fireworks_ai/accounts/fireworks/models/deepseek-v3", 
-                api_token=self.fireworks_api_key
-            ),
-            extraction_type="schema",
-            schema=CompanySummary.model_json_schema(),
-            instruction="Extract a concise 2-3 line company summary focusing on: what they do, their industry, and their focus.",
-            chunk_token_threshold=2000,
-            overlap_rate=0.0,
-            apply_chunking=False,
-            input_format="markdown",
-            extra_args={"temperature": 0.1, "max_tokens": 150},
-        )
+        if self._browser is None:
+            raise RuntimeError("OutreachGenerator must be used as `async with OutreachGenerator()`")
         
-        config = CrawlerRunConfig(
-            extraction_strategy=llm_strategy,
-            cache_mode=CacheMode.BYPASS,
-            remove_overlay_elements=True,
-            remove_forms=True,
-            only_text=True,  # Focus on text content only
-            exclude_external_links=True,  # Remove external navigation
-            exclude_social_media_links=True,  # Remove social media buttons
-            #page_timeout=30000,  # 30 seconds timeout
-        )#
+        async with self._scrape_sem:
+            logger.debug(f"Scrape slots free: {self._scrape_sem._value}")
+            # A hung page must not hold a slot forever
+            result = await asyncio.wait_for(self._browser.arun(url=url, config=self._crawl_cfg), timeout=SCRAPE_TIMEOUT)
         
-        async with AsyncWebCrawler(config=BrowserConfig(headless=True,verbose=True)) as crawler:
-            result = await crawler.arun(url=url, config=config)
+        if result.success and result.extracted_content:
+            # LLM extraction only - works across all website types
             
-            if result.success and result.extracted_content:
-                # LLM extraction only - works across all website types
-                
-                # Return extracted content
-                return self._parse_extraction_result(result.extracted_content)
-            else:
-                logger.warning(f"LLM extraction failed for {url}")
-                return ""
+            # Return extracted content
+            return self._parse_extraction_result(result.extracted_content)
+        else:
+            logger.warning(f"LLM extraction failed for {url}")
+            return ""
 
 
     def _parse_extraction_result(self, extracted_content: str) -> str:
         """Parse extraction result to get summary"""
         try:
-            content_data = json.loads(extracted_content)
+            content_data = orjson.loads(extracted_content)
             
             if isinstance(content_data, dict) and "summary" in content_data:
                 return content_data["summary"]
@@ -279,53 +667,139 @@ EMAIL_END"""
             logger.warning("No summary found in extraction result")
             return "No summary extracted"
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse extraction result: {e}")
             return "Failed to parse extraction result"
 
-    @backoff.on_exception(backoff.expo, Exception, max_tries=3)
-    def generate_content(self, prompt: str) -> tuple[str, str]:
+    async def generate_content(self, user: str) -> tuple[str, str]:
         """Generate LinkedIn request and email content with retry logic."""
+        if self._system_message is None:
+            raise RuntimeError("set_resume() must be called before generating content")
+        cacheable = LLM_TEMPERATURE == 0
+        key = self._prompt_key(user)
+        if cacheable:
+            cached = await self._run_io(self._get_cached_content, key)
+            if cached is not None:
+                logger.info("Using cached generated content")
+                return cached
+        
+        if self._gen_worker is None:
+            raise RuntimeError("OutreachGenerator must be used as `async with OutreachGenerator()`")
+        
         try:
-            self._apply_rate_limit()
-            
-            response = fireworks.client.ChatCompletion.create(
-                model="accounts/fireworks/models/deepseek-v3",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=400,
-                temperature=0.1,
-            )
-            
-            generated_text = response.choices[0].message.content
-            return self._parse_generated_content(generated_text)
+            # Cache misses are packed with other rows' requests by _generation_worker
+            messages = [self._system_message, {"role": "user", "content": user}]
+            future = asyncio.get_running_loop().create_future()
+            await self._gen_queue.put((messages, future))
+            linkedin_request, email_full = await future
+            if cacheable and not linkedin_request.startswith("Failed") and not email_full.startswith("Failed"):
+                await self._run_io(self._cache_content, key, linkedin_request, email_full)
+            return linkedin_request, email_full
             
         except Exception as e:
             logger.error(f"Error generating content: {e}")
             raise
 
+    async def generate_content_batch(self, batch: List[List[Dict[str, str]]]) -> List[Union[tuple[str, str], Exception]]:
+        """Generate content for several leads sharing one system prefix in a single request.
+        
+        Each lead's user message is wrapped in <LEAD id=N> tags and the model answers in kind;
+        a lead missing from the response is regenerated on its own. If that fails, the exception
+        is returned in the lead's slot so the leads parsed from the batched reply are kept.
+        """
+        if len(batch) == 1:
+            return [self._parse_generated_content(await self._chat(batch[0], LLM_MAX_TOKENS))]
+        
+        leads = "\n\n".join(
+            f"<LEAD id={i}>\n{messages[-1]['content']}\n</LEAD>" for i, messages in enumerate(batch)
+        )
+        user = (
+            f"Produce outputs for the following {len(batch)} leads. Write each lead's output in the "
+            f"format above and wrap it in the same <LEAD id=N></LEAD> tags as its input.\n\n{leads}"
+        )
+        generated_text = await self._chat([batch[0][0], {"role": "user", "content": user}], LLM_MAX_TOKENS * len(batch))
+        
+        results = []
+        for i, messages in enumerate(batch):
+            block = _between(generated_text, f"<LEAD id={i}>", "</LEAD>")
+            if block is None:
+                logger.warning(f"Lead {i} missing from batched response, generating it alone")
+                try:
+                    block = await self._chat(messages, LLM_MAX_TOKENS)
+                except Exception as e:
+                    results.append(e)
+                    continue
+            results.append(self._parse_generated_content(block))
+        return results
+
+    async def _chat(self, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        """One Fireworks chat completion; returns the generated text"""
+        response = await self._request(
+            self._fw_limiter,
+            "POST",
+            FIREWORKS_CHAT_URL,
+            headers={"Authorization": f"Bearer {self.fireworks_api_key}"},
+            json={
+                "model": LLM_MODEL,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": LLM_TEMPERATURE,
+            },
+        )
+        return orjson.loads(response.content)["choices"][0]["message"]["content"]
+
+    async def _generation_worker(self) -> None:
+        """Collect queued generation requests into batches of up to GENERATION_BATCH_SIZE"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._gen_queue.get()]
+            deadline = loop.time() + GENERATION_BATCH_WINDOW
+            while len(batch) < GENERATION_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._gen_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Run the batch in the background so the next one can start filling
+            task = asyncio.create_task(self._run_generation_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_generation_batch(self, batch: List[tuple]) -> None:
+        """Generate a batch and resolve each row's future"""
+        # Only leads with the same system prefix can share a request
+        groups: Dict[str, List[tuple]] = {}
+        for messages, future in batch:
+            groups.setdefault(messages[0]["content"], []).append((messages, future))
+        
+        for items in groups.values():
+            try:
+                results = await self.generate_content_batch([messages for messages, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(items, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
     def _parse_generated_content(self, generated_text: str) -> tuple[str, str]:
         """Parse generated content to extract LinkedIn request and email."""
         try:
-            # Extract LinkedIn request
-            linkedin_match = re.search(
-                r'LINKEDIN_REQUEST_START\s*(.*?)\s*LINKEDIN_REQUEST_END', 
-                generated_text, 
-                re.DOTALL
-            )
-            linkedin_request = linkedin_match.group(1).strip() if linkedin_match else "Failed to parse LinkedIn request"
-            
-            # Extract email
-            email_match = re.search(
-                r'EMAIL_START\s*(.*?)\s*EMAIL_END', 
-                generated_text, 
-                re.DOTALL
-            )
-            email_full = email_match.group(1).strip() if email_match else "Failed to parse email"
+            linkedin_request = _between(generated_text, *_LINKEDIN_MARKERS) or "Failed to parse LinkedIn request"
+            email_full = _between(generated_text, *_EMAIL_MARKERS) or "Failed to parse email"
             
             # Validate LinkedIn request length
             if len(linkedin_request) > 300:
                 logger.warning(f"LinkedIn request too long ({len(linkedin_request)} chars), truncating")
-                linkedin_request = linkedin_request[:297] + "..."
+                linkedin_request = textwrap.shorten(linkedin_request, width=300, placeholder="...")
             
             return linkedin_request, email_full
             
@@ -344,7 +818,7 @@ EMAIL_END"""
         
         return ""
 
-    async def process_row(self, index: int, row: pd.Series, resume_content: str) -> Dict[str, str]:
+    async def process_row(self, index: int, row: Dict[str, str]) -> Dict[str, str]:
         """Process a single row with comprehensive error handling."""
         try:
             logger.info(f"Processing row {index}: {row.get('First Name', '')} {row.get('Last Name', '')}")
@@ -359,22 +833,20 @@ EMAIL_END"""
             last_name = row.get("Last Name", "").strip()
             if first_name and last_name:
                 search_query = f"{first_name} {last_name} {company_name}"
-                lead_info = self.get_person_info(search_query)
+                lead_info = await self.get_person_info(search_query)
             else:
                 logger.warning(f"Row {index}: Missing first/last name")
                 lead_info = ""
             
             # Get company information (with caching)
-            if company_name in self.company_cache:
+            company_info = await self._run_io(self.get_cached_company, company_name, company_website)
+            if company_info is not None:
                 logger.info(f"Using cached info for {company_name}")
-                company_info = self.company_cache[company_name]
             else:
                 if company_website:
-                    logger.info(f"Scraping new company: {company_name}")
-                    company_info = await self.scrape_url(company_website)
+                    company_info, source = await self._scrape_once(company_name, company_website)
                     if company_info and company_info != "No summary extracted":
-                        self.company_cache[company_name] = company_info
-                        self.save_company_cache()
+                        await self._run_io(self.cache_company, company_name, company_info, source, company_website)
                 else:
                     logger.warning(f"Row {index}: No company website provided")
                     company_info = ""
@@ -385,8 +857,7 @@ EMAIL_END"""
                 return {"LinkedIn Request": "No content available", "Cold Email": "No content available"}
             
             # Generate content
-            prompt = self.get_prompt(
-                resume=resume_content,
+            user_message = self.get_user_message(
                 lead_title=row.get("Lead Title", ""),
                 company_name=company_name,
                 job_title=row.get("Job Title", ""),
@@ -394,7 +865,7 @@ EMAIL_END"""
                 company_info=company_info
             )
             
-            linkedin_request, email_full = self.generate_content(prompt)
+            linkedin_request, email_full = await self.generate_content(user_message)
             
             logger.info(f"✅ Successfully processed row {index}")
             return {"LinkedIn Request": linkedin_request, "Cold Email": email_full}
@@ -406,66 +877,119 @@ EMAIL_END"""
     async def process_excel_file(self, input_file: str, resume_file: str, output_file: str = None) -> None:
         """Main processing function with improved error handling and progress tracking."""
         # print("  Starting Excel file processing...")
+        run_started = datetime.now()
+        self._run_started = run_started.isoformat(timespec="seconds")
         if output_file is None:
-            output_file = f"output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            output_file = f"output_{run_started.strftime('%Y%m%d_%H%M%S')}.xlsx"
         # print(f"  Output will be saved to: {output_file}")
         
         try:
             # Load input files
-            logger.info(f"Loading input files...")
-            df = pd.read_excel(input_file)
-            logger.info(f"Loaded {len(df)} rows from Excel file")
+            logger.info(f"Run started at {self._run_started}. Loading input files...")
+            df = await self._run_io(_load_leads, input_file)
+            logger.info(f"Loaded {len(df)} rows from {input_file}")
             
-            with open(resume_file, "r", encoding='utf-8') as f:
-                resume_content = f.read()
+            resume_content = await self._run_io(Path(resume_file).read_text, "utf-8")
+            self.set_resume(resume_content)
             logger.info("Resume loaded successfully")
             
             # Validate DataFrame columns
             required_columns = ["Company Name"]
 
             
-            # Add new columns for generated content
-            df["LinkedIn Request"] = ""
-            df["Cold Email"] = ""
-            df["Processing Status"] = ""
-            df["Processed At"] = ""
+            # Pull the fields process_row needs into plain dicts once; missing optional columns read as ""
+            rows = df.reindex(columns=ROW_COLUMNS).fillna("").to_dict("records")
+            linkedin_out: List[str] = [""] * len(rows)
+            email_out: List[str] = [""] * len(rows)
+            status_out: List[str] = [""] * len(rows)
+            # Epoch seconds per row, formatted in one vectorized pass at the end
+            processed_at: List[Optional[int]] = [None] * len(rows)
+            
+            def _with_results() -> pd.DataFrame:
+                finished = pd.to_datetime(pd.Series(processed_at, dtype="float64"), unit="s", utc=True)
+                local_tz = run_started.astimezone().tzinfo
+                return df.assign(**{
+                    "LinkedIn Request": linkedin_out,
+                    "Cold Email": email_out,
+                    "Processing Status": status_out,
+                    "Processed At": finished.dt.tz_convert(local_tz).dt.strftime("%Y-%m-%dT%H:%M:%S").fillna("").to_numpy(),
+                })
             
-            # Process each row
+            # Finished rows are checkpointed as small part files; read them back with pd.read_parquet(progress_dir)
+            progress_dir = os.path.join(
+                os.path.dirname(os.path.abspath(output_file)),
+                f"{PROGRESS_DIR_PREFIX}{run_started.strftime('%Y%m%d_%H%M%S')}",
+            )
+            await self._run_io(functools.partial(os.makedirs, progress_dir, exist_ok=True))
+            logger.info(f"Checkpointing progress to {progress_dir}")
+            pending_progress: List[int] = []
+            progress_parts = 0
+            progress_lock = asyncio.Lock()
+            
+            async def _flush_progress() -> None:
+                nonlocal progress_parts
+                async with progress_lock:
+                    if not pending_progress:
+                        return
+                    table = pa.Table.from_pylist([
+                        {
+                            "Row": pos,
+                            "First Name": str(rows[pos]["First Name"]),
+                            "Last Name": str(rows[pos]["Last Name"]),
+                            "Company Name": str(rows[pos]["Company Name"]),
+                            "LinkedIn Request": linkedin_out[pos],
+                            "Cold Email": email_out[pos],
+                            "Processing Status": status_out[pos],
+                            "Processed At": processed_at[pos],
+                        }
+                        for pos in pending_progress
+                    ], schema=PROGRESS_SCHEMA)
+                    pending_progress.clear()
+                    await self._run_io(_write_progress_part, progress_dir, table, progress_parts)
+                    progress_parts += 1
+            
+            # Process rows concurrently; per-service token buckets pace the API calls
             successful_rows = 0
             failed_rows = 0
+            completed_rows = 0
+            sem = asyncio.Semaphore(self.max_concurrency)
             
-            for index, row in df.iterrows():
-                try:
-                    result = await self.process_row(index, row, resume_content)
-                    
-                    # Update DataFrame
-                    df.at[index, "LinkedIn Request"] = result["LinkedIn Request"]
-                    df.at[index, "Cold Email"] = result["Cold Email"]
-                    df.at[index, "Processing Status"] = "Success" if not result["LinkedIn Request"].startswith("Error") else "Failed"
-                    df.at[index, "Processed At"] = datetime.now().isoformat()
-                    
-                    if result["LinkedIn Request"].startswith("Error"):
+            async def _bounded(pos, index, row):
+                nonlocal successful_rows, failed_rows, completed_rows
+                async with sem:
+                    try:
+                        result = await self.process_row(index, row)
+                        
+                        linkedin_out[pos] = result["LinkedIn Request"]
+                        email_out[pos] = result["Cold Email"]
+                        if result["LinkedIn Request"].startswith("Error"):
+                            status_out[pos] = "Failed"
+                            failed_rows += 1
+                        else:
+                            status_out[pos] = "Success"
+                            successful_rows += 1
+                        
+                    except Exception as e:
+                        logger.error(f"Fatal error processing row {index}: {e}")
+                        status_out[pos] = f"Fatal Error: {str(e)}"
                         failed_rows += 1
-                    else:
-                        successful_rows += 1
-                    
-                    # Save progress periodically
-                    if (index + 1) % 5 == 0:
-                        df.to_excel(output_file, index=False)
-                        logger.info(f"Progress saved: {index + 1}/{len(df)} rows processed")
+                    processed_at[pos] = int(time.time())
                     
-                    # Rate limiting between rows
-                    await asyncio.sleep(1)
-                    
-                except Exception as e:
-                    logger.error(f"Fatal error processing row {index}: {e}")
-                    df.at[index, "Processing Status"] = f"Fatal Error: {str(e)}"
-                    df.at[index, "Processed At"] = datetime.now().isoformat()
-                    failed_rows += 1
+                    # Checkpoint periodically to Parquet; the workbook is written once at the end
+                    completed_rows += 1
+                    pending_progress.append(pos)
+                    if len(pending_progress) >= PROGRESS_SAVE_EVERY:
+                        await _flush_progress()
+                        logger.info(f"Progress saved: {completed_rows}/{len(df)} rows processed")
+            
+            await asyncio.gather(*(
+                _bounded(pos, index, row) for pos, (index, row) in enumerate(zip(df.index, rows))
+            ))
+            await _flush_progress()
             
             # Final save
-            df.to_excel(output_file, index=False)
-            self.save_company_cache()  # Final cache save
+            df = _with_results()
+            await self._run_io(functools.partial(df.to_excel, output_file, index=False))
             
             # Summary
             logger.info(f"""
@@ -474,7 +998,7 @@ EMAIL_END"""
             - Successful: {successful_rows}
             - Failed: {failed_rows}
             - Output saved to: {output_file}
-            - Company cache: {len(self.company_cache)} companies
+            - Company cache: {await self._run_io(self.cached_company_count)} companies
             """)
             
         except Exception as e:
@@ -505,12 +1029,12 @@ async def main():
         
         # print("Initializing OutreachGenerator...")
         # Initialize the generator
-        generator = OutreachGenerator()
-        # print("✅ OutreachGenerator initialized")
-        
-        # print("Starting file processing...")
-        # Process the files
-        await generator.process_excel_file(INPUT_FILE, RESUME_FILE, OUTPUT_FILE)
+        async with OutreachGenerator() as generator:
+            # print("✅ OutreachGenerator initialized")
+            
+            # print("Starting file processing...")
+            # Process the files
+            await generator.process_excel_file(INPUT_FILE, RESUME_FILE, OUTPUT_FILE)
         print("✅ Processing completed successfully!")
         
     except Exception as e:
@@ -2,19 +2,27 @@ import os
 import pandas as pd 
 import asyncio
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import atexit
 from dotenv import load_dotenv
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BrowserConfig, LLMConfig, CacheMode
+from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, BrowserConfig, CacheMode
 import fireworks.client
 from serpapi import GoogleSearch
 import json
-from crawl4ai.extraction_strategy import LLMExtractionStrategy
+import orjson
+from crawl4ai.content_filter_strategy import BM25ContentFilter
+from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 from pydantic import BaseModel, Field
 from pathlib import Path
 import time
+import pickle
+import contextlib
 import backoff
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 from datetime import datetime
 import re
+from urllib.parse import urlsplit
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,13 +31,21 @@ load_dotenv()
 log_file = 'outreach_workflow.log'
 # print(f"Setting up logging to: {os.path.abspath(log_file)}")
 
+# Records are queued and written to the file and console on the listener's thread,
+# so a slow disk or terminal never blocks the event loop
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue,
+    logging.FileHandler(log_file, mode='a', encoding='utf-8'),
+    logging.StreamHandler(),
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, mode='a', encoding='utf-8'),
-        logging.StreamHandler()
-    ],
+    handlers=[QueueHandler(_log_queue)],
     force=True  # Override any existing logging config
 )
 logger = logging.getLogger(__name__)
@@ -39,10 +55,80 @@ logger = logging.getLogger(__name__)
 logger.info("=== LOGGING INITIALIZED ===")
 # print(f"Log file exists: {os.path.exists(log_file)}")
 
+# Company cache: snapshot, journal of entries added since the snapshot, previous snapshot
+CACHE_SNAPSHOT = "company_cache.pkl"
+CACHE_JOURNAL = "company_cache.jsonl"
+CACHE_BACKUP = "company_cache.backup.pkl"
+LEGACY_CACHE_FILE = "company_cache.txt"
+# Summaries older than this are served, then refreshed in the background
+COMPANY_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+# Failed scrapes are remembered for this long before the site is tried again
+NEGATIVE_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+# Scrape results that mean "no usable summary"
+FAILED_SUMMARIES = ("", "No summary extracted", "Failed to parse extraction result")
+# Scraped summaries keyed by normalized URL, reused across runs
+URL_CACHE_FILE = "url_cache.pkl"
+
+def _normalize_url(url: str) -> str:
+    """Lowercase scheme and host, drop query and fragment, strip the trailing slash"""
+    parts = urlsplit(url.strip())
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+# Page sections worth sending to the summary model; the rest of the markdown is dropped
+COMPANY_SECTION_QUERY = "about us mission what we do products platform services company"
+# Hard cap on page text sent to the summary model, whatever the filter keeps
+SUMMARY_INPUT_MAX_CHARS = 3000
+SUMMARY_INSTRUCTION = (
+    "Extract a concise 2-3 line company summary focusing on: what they do, their industry, and their focus. "
+    'Return ONLY valid JSON: {"summary": "..."}'
+)
+
+# Instructions and output schema, identical for every row
+SYSTEM_PROMPT = """Write outreach asking about open opportunities at the user's company, using MY SKILLS below.
+1. LinkedIn request: <300 chars, ask about openings, reference the company.
+2. Cold email:
+   - 2-3 lines of pleasantries and introduction
+   - 3 achievements from my resume that match the company's business
+   - "Looking forward to hearing from you, attaching my resume for your reference./ ask for an short 15 min call"
+Return ONLY valid JSON: {"linkedin_request": "...", "email_subject": "...", "email_body": "..."}"""
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _collapse_whitespace(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+def _loads_json(text: str):
+    """Parse a JSON-mode reply, dropping anything after the last closing brace if the first parse fails"""
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return orjson.loads(text.rsplit("}", 1)[0] + "}")
+
+# Generated columns added to the sheet
+RESULT_COLUMNS = ["LinkedIn Request", "Cold Email", "Processing Status", "Processed At"]
+
+# Completed rows between progress checkpoints
+PROGRESS_SAVE_EVERY = 25
+PROGRESS_FILE = "progress.parquet"
+
+def _write_progress(records: List[Dict]) -> None:
+    """Atomically replace PROGRESS_FILE, so a crash mid-write leaves the previous checkpoint readable"""
+    tmp_file = PROGRESS_FILE + ".tmp"
+    pd.DataFrame(records).to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, PROGRESS_FILE)
+
+# Rows packed into one Fireworks request, and how long to wait for a batch to fill.
+# 5 x ~400 output tokens plus 5 prompts stays well inside the model's context window.
+GENERATION_BATCH_SIZE = 5
+GENERATION_BATCH_WINDOW = 0.2
+
 # Define schema for company summary extraction
 class CompanySummary(BaseModel):
     summary: str = Field(description="A concise 2-3 line summary of what the company does, who they are, and what they're looking for")
 
+# Computed once; model_json_schema() reflects over the model on every call
+COMPANY_SUMMARY_SCHEMA = CompanySummary.model_json_schema()
+
 class OutreachGenerator:
     def __init__(self):
         print("  Initializing OutreachGenerator...")
@@ -64,164 +150,325 @@ class OutreachGenerator:
         self.company_cache = self.load_company_cache()
         print(f"  ✅ Loaded {len(self.company_cache)} cached companies")
         
-        # Rate limiting
-        self.last_api_call = 0
+        # Rate limiting; the lock is created on first use, inside the running event loop
+        self.last_api_call = 0.0
         self.min_delay = 1.0  # Minimum delay between API calls
+        self._rate_limit_lock: Optional[asyncio.Lock] = None
+        
+        # Models: a small one for the simple summary extraction, the large one for outreach
+        self.small_model = "accounts/fireworks/models/llama-v3p1-8b-instruct"
+        self.large_model = "accounts/fireworks/models/deepseek-v3"
+        
+        # Page crawl shared by every URL; the summary is extracted from its trimmed markdown
+        self._crawler_config = CrawlerRunConfig(
+            markdown_generator=DefaultMarkdownGenerator(
+                content_filter=BM25ContentFilter(user_query=COMPANY_SECTION_QUERY)
+            ),
+            cache_mode=CacheMode.ENABLED,  # Pages are served from crawl4ai's local cache when present
+            remove_overlay_elements=True,
+            remove_forms=True,
+            only_text=True,  # Focus on text content only
+            exclude_external_links=True,  # Remove external navigation
+            exclude_social_media_links=True,  # Remove social media buttons
+        )
+        # Refreshes fetch the live page and overwrite the cached copy
+        self._refresh_crawler_config = self._crawler_config.clone(cache_mode=CacheMode.WRITE_ONLY)
+        
+        # Number of rows processed concurrently
+        self.max_concurrency = 16
+        
+        # URL-level cache: finished summaries from disk, plus in-flight scrapes for this run
+        self._url_results: Dict[str, tuple] = self.load_url_cache()
+        self._url_cache: Dict[str, asyncio.Future] = {}
+        
+        # Instructions + resume, built by set_resume()
+        self._system_prompt = SYSTEM_PROMPT
+        
+        # Prompts waiting to be batched; the worker starts on the first generate()
+        self._gen_queue: asyncio.Queue = asyncio.Queue()
+        self._gen_worker: Optional[asyncio.Task] = None
+        self._batch_tasks: set = set()
         
-        logger.info(f"Initialized with {len(self.company_cache)} cached companies")
+        # Background refreshes of stale cache entries, keyed by company name
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        
+        # Shared browser, started on first scrape by _get_crawler()
+        self._crawler: Optional[AsyncWebCrawler] = None
+        self._crawler_lock = asyncio.Lock()
+        
+        logger.info("Initialized with %s cached companies", len(self.company_cache))
 
-    # Caching methods with improved error handling
-    def load_company_cache(self) -> Dict[str, str]:
-        """Load company cache from file with error handling"""
-        cache_file = "company_cache.txt"
+    # Caching methods: pickle snapshot + append-only JSONL journal of entries added since
+    def load_company_cache(self) -> Dict[str, dict]:
+        """Load the last snapshot, then replay entries journaled after it.
+
+        Entries are {"summary": str, "ts": float, "ok": bool}; ok=False marks a failed scrape.
+        """
         cache = {}
         try:
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as f:
+            # A save interrupted between its two renames leaves only the backup
+            snapshot = CACHE_SNAPSHOT if os.path.exists(CACHE_SNAPSHOT) else CACHE_BACKUP
+            if os.path.exists(snapshot):
+                with open(snapshot, 'rb') as f:
+                    cache = pickle.load(f)
+            elif os.path.exists(LEGACY_CACHE_FILE):
+                # Caches written before the snapshot format existed
+                with open(LEGACY_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    # One read, then C-level splits; no per-line Python branching
+                    pairs = (line.split('|||', 1) for line in f.read().splitlines() if '|||' in line)
+                    cache = {company_name.strip(): summary.strip() for company_name, summary in pairs}
+        except Exception as e:
+            logger.error("Error loading company cache: %s", e)
+        
+        # Older caches stored bare summaries; their age is unknown, so start it now
+        loaded_at = time.time()
+        for company_name, value in cache.items():
+            if isinstance(value, str):
+                cache[company_name] = {"summary": value, "ts": loaded_at, "ok": True}
+        
+        try:
+            if os.path.exists(CACHE_JOURNAL):
+                with open(CACHE_JOURNAL, 'r', encoding='utf-8') as f:
                     for line_num, line in enumerate(f, 1):
                         try:
-                            if '|||' in line:
-                                parts = line.strip().split('|||', 1)
-                                if len(parts) == 2:
-                                    company_name, summary = parts
-                                    cache[company_name.strip()] = summary.strip()
-                        except Exception as e:
-                            logger.warning(f"Error parsing cache line {line_num}: {e}")
+                            entry = json.loads(line)
+                            cache[entry["n"]] = {
+                                "summary": entry["s"],
+                                "ts": entry.get("t", loaded_at),
+                                "ok": entry.get("ok", True),
+                            }
+                        except (ValueError, KeyError, TypeError) as e:
+                            # A torn last line from an interrupted run
+                            logger.warning("Error parsing cache journal line %s: %s", line_num, e)
         except Exception as e:
-            logger.error(f"Error loading company cache: {e}")
+            logger.error("Error replaying company cache journal: %s", e)
         return cache
 
+    def _append_cache_entry(self, company_name: str, entry: dict) -> None:
+        """Journal one new entry; O(1) instead of rewriting the whole cache"""
+        try:
+            with open(CACHE_JOURNAL, 'a', encoding='utf-8') as f:
+                record = {"n": company_name, "s": entry["summary"], "t": entry["ts"], "ok": entry["ok"]}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error("Error appending to company cache: %s", e)
+
     def save_company_cache(self) -> None:
-        """Save company cache to file with backup"""
-        cache_file = "company_cache.txt"
-        backup_file = "company_cache.backup.txt"
-        
+        """Write a snapshot of the whole cache and clear the journal it supersedes"""
+        tmp_file = CACHE_SNAPSHOT + ".tmp"
         try:
-            # Create backup of existing file
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-            
-            # Write new cache
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                for company_name, summary in self.company_cache.items():
-                    # Sanitize data to prevent parsing issues
-                    clean_company = company_name.replace('|||', '').strip()
-                    clean_summary = summary.replace('|||', '').strip()
-                    f.write(f"{clean_company}|||{clean_summary}\n")
-            logger.info(f"Saved {len(self.company_cache)} companies to cache")
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(self.company_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Keep the previous snapshot as the backup (rename, no copy)
+            if os.path.exists(CACHE_SNAPSHOT):
+                os.replace(CACHE_SNAPSHOT, CACHE_BACKUP)
+            os.replace(tmp_file, CACHE_SNAPSHOT)
+            if os.path.exists(CACHE_JOURNAL):
+                os.remove(CACHE_JOURNAL)
+            logger.info("Saved %s companies to cache", len(self.company_cache))
         except Exception as e:
-            logger.error(f"Error saving company cache: {e}")
+            logger.error("Error saving company cache: %s", e)
 
+    def load_url_cache(self) -> Dict[str, tuple]:
+        """Load (summary, scraped-at timestamp) pairs cached by normalized URL"""
+        cache = {}
+        try:
+            if os.path.exists(URL_CACHE_FILE):
+                with open(URL_CACHE_FILE, 'rb') as f:
+                    cache = pickle.load(f)
+        except Exception as e:
+            logger.error("Error loading URL cache: %s", e)
+        # Older caches stored bare summaries; their age is unknown, so start it now
+        loaded_at = time.time()
+        return {
+            key: (value, loaded_at) if isinstance(value, str) else value
+            for key, value in cache.items()
+        }
 
+    def save_url_cache(self) -> None:
+        """Atomically write the URL cache"""
+        tmp_file = URL_CACHE_FILE + ".tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(self._url_results, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, URL_CACHE_FILE)
+        except Exception as e:
+            logger.error("Error saving URL cache: %s", e)
 
-    def _apply_rate_limit(self) -> None:
-        """Apply rate limiting between API calls"""
-        current_time = time.time()
-        time_since_last_call = current_time - self.last_api_call
+    async def _apply_rate_limit(self) -> None:
+        """Apply rate limiting between API calls without blocking the event loop"""
+        if self._rate_limit_lock is None:
+            self._rate_limit_lock = asyncio.Lock()
+        async with self._rate_limit_lock:
+            current_time = time.monotonic()
+            # Reserve the next free slot, then sleep outside the lock
+            next_slot = max(current_time, self.last_api_call + self.min_delay)
+            self.last_api_call = next_slot
         
-        if time_since_last_call < self.min_delay:
-            sleep_time = self.min_delay - time_since_last_call
-            time.sleep(sleep_time)
-        
-        self.last_api_call = time.time()
+        if next_slot > current_time:
+            await asyncio.sleep(next_slot - current_time)
 
-    def get_prompt(self, resume: str, lead_title: str, company_name: str, 
-                    company_info: str) -> str:
-        """Generate improved prompt for the LLM focused on company info."""
+    def set_resume(self, resume: str) -> None:
+        """Build the system prompt (instructions + condensed resume) once per run"""
+        resume = _collapse_whitespace(resume)
         # Truncate resume to first 500 characters to save tokens
         resume_short = resume[:500] + "..." if len(resume) > 500 else resume
-        
-        prompt = f"""Create outreach asking about open opportunities at {company_name}.
-
-MY SKILLS: {resume_short}
-CONTACT: {lead_title}
-COMPANY: {company_info}
-
-Create:
-1. LinkedIn request (<300 chars, ask about openings, reference company)
-2. Cold email with this exact structure:
-   - 2-3 lines of pleasantries and introduction
-   - 3 achievements from my resume that match the company's business
-   - "Looking forward to hearing from you, attaching my resume for your reference./ ask for an short 15 min call"
+        self._system_prompt = f"{SYSTEM_PROMPT}\n\nMY SKILLS: {resume_short}"
 
-Return ONLY valid JSON:
-{{
-    "linkedin_request": "your linkedin message here",
-    "email_subject": "your email subject here", 
-    "email_body": "your email body here"
-}}"""
-        return prompt
+    def get_prompt(self, lead_title: str, company_name: str, company_info: str) -> str:
+        """Per-row user message; the instructions and resume live in the system prompt."""
+        return f"Company: {company_name}\nContact: {lead_title}\nCompany info: {_collapse_whitespace(company_info)}"
 
     @backoff.on_exception(backoff.expo, Exception, max_tries=3)
-    async def scrape_url(self, url: str) -> str:
+    async def scrape_url(self, url: str, fresh: bool = False) -> str:
         """Enhanced URL scraping with better error handling and validation."""
         if not self._is_valid_url(url):
-            logger.warning(f"Invalid URL provided: {url}")
+            logger.warning("Invalid URL provided: %s", url)
             return ""
             
-        logger.info(f"Scraping URL: {url}")
+        logger.info("Scraping URL: %s", url)
         
         try:
-            return await self._scrape_with_llm_strategy(url)
+            return await self._scrape_with_llm_strategy(url, fresh)
                 
         except Exception as e:
-            logger.error(f"Error scraping {url}: {e}")
+            logger.error("Error scraping %s: %s", url, e)
             return ""
 
+    async def scrape_url_cached(self, url: str, fresh: bool = False) -> tuple[str, float]:
+        """scrape_url memoized by normalized URL; concurrent rows for one site share a single fetch.
+        
+        Returns (summary, time the page was scraped). Summaries older than COMPANY_CACHE_TTL_SECONDS
+        are scraped again from the live page. fresh=True skips both caches and re-downloads the
+        page instead of reading crawl4ai's page cache.
+        """
+        key = _normalize_url(url)
+        future = None
+        if not fresh:
+            cached = self._url_results.get(key)
+            if cached is not None and time.time() - cached[1] < COMPANY_CACHE_TTL_SECONDS:
+                logger.info("Using cached scrape for %s", key)
+                return cached
+            # An expired entry is re-fetched live; crawl4ai's copy of the page is as old as the entry
+            fresh = cached is not None
+            future = self._url_cache.get(key)
+        
+        if future is None:
+            future = asyncio.ensure_future(self._scrape_and_remember(key, url, fresh))
+            self._url_cache[key] = future
+        # Shielded so one cancelled row doesn't cancel the fetch for the others
+        return await asyncio.shield(future)
+
+    async def _scrape_and_remember(self, key: str, url: str, fresh: bool) -> tuple[str, float]:
+        summary = await self.scrape_url(url, fresh)
+        result = (summary, time.time())
+        if summary not in FAILED_SUMMARIES:
+            self._url_results[key] = result
+        return result
+
+    async def _fetch_company_info(self, company_name: str, url: str) -> str:
+        """Scrape a company's site and cache the outcome, including failures; returns "" on failure"""
+        # An existing entry here is an expired failure; retry against the live site
+        summary, scraped_at = await self.scrape_url_cached(url, fresh=company_name in self.company_cache)
+        ok = summary not in FAILED_SUMMARIES
+        # A summary reused from the URL cache keeps its original age
+        entry = {"summary": summary if ok else "", "ts": scraped_at, "ok": ok}
+        self.company_cache[company_name] = entry
+        self._append_cache_entry(company_name, entry)
+        return entry["summary"]
+
+    async def _refresh(self, company_name: str, url: str) -> None:
+        """Re-scrape a stale entry, keeping the old summary if the new scrape fails"""
+        try:
+            summary, scraped_at = await self.scrape_url_cached(url, fresh=True)
+            if summary not in FAILED_SUMMARIES:
+                entry = {"summary": summary, "ts": scraped_at, "ok": True}
+                self.company_cache[company_name] = entry
+                self._append_cache_entry(company_name, entry)
+                logger.info("Refreshed cached info for %s", company_name)
+        except Exception as e:
+            logger.warning("Background refresh failed for %s: %s", company_name, e)
+        finally:
+            self._refresh_tasks.pop(company_name, None)
+
+    def _get_company_info(self, company_name: str, url: str) -> Optional[str]:
+        """Cached info for a company, or None on a miss.
+
+        Stale summaries are returned as-is while a background task refreshes them;
+        recent failures return "" so dead sites aren't re-scraped every run.
+        """
+        entry = self.company_cache.get(company_name)
+        if entry is None:
+            return None
+        age = time.time() - entry["ts"]
+        if not entry["ok"]:
+            return "" if age < NEGATIVE_CACHE_TTL_SECONDS else None
+        if age >= COMPANY_CACHE_TTL_SECONDS and url and company_name not in self._refresh_tasks:
+            self._refresh_tasks[company_name] = asyncio.create_task(self._refresh(company_name, url))
+        return entry["summary"]
+
+    async def _get_crawler(self) -> AsyncWebCrawler:
+        """Start the shared headless browser on first use"""
+        async with self._crawler_lock:
+            if self._crawler is None:
+                crawler = AsyncWebCrawler(config=BrowserConfig(headless=True, verbose=False))
+                await crawler.__aenter__()
+                self._crawler = crawler
+            return self._crawler
+
+    async def close(self) -> None:
+        """Stop the generation batcher and shut down the shared browser, if they were started"""
+        if self._gen_worker is not None:
+            self._gen_worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._gen_worker
+            self._gen_worker = None
+        if self._crawler is not None:
+            await self._crawler.__aexit__(None, None, None)
+            self._crawler = None
+
     def _is_valid_url(self, url) -> bool:
         """Validate URL format"""
         if not url or not isinstance(url, str):
             return False
         return url.startswith(('http://', 'https://'))
 
-    async def _scrape_with_llm_strategy(self, url: str) -> str:
-        """Scrape using LLM strategy"""
+    async def _scrape_with_llm_strategy(self, url: str, fresh: bool = False) -> str:
+        """Crawl the page, trim its markdown, and summarize it with the small model"""
         logger.info("Using LLM strategy ")
         
-        llm_strategy = LLMExtractionStrategy(
-            llm_config=LLMConfig(
-                provider="fireworks_ai/accounts/fireworks/models/deepseek-v3", 
-                api_token=self.fireworks_api_key
-            ),
-            extraction_type="schema",
-            schema=CompanySummary.model_json_schema(),
-            instruction="Extract a concise 2-3 line company summary focusing on: what they do, their industry, and their focus.",
-            chunk_token_threshold=2000,
-            overlap_rate=0.0,
-            apply_chunking=False,
-            input_format="markdown",
-            extra_args={"temperature": 0.1, "max_tokens": 150},
-        )
+        crawler = await self._get_crawler()
+        config = self._refresh_crawler_config if fresh else self._crawler_config
+        result = await crawler.arun(url=url, config=config)
         
-        config = CrawlerRunConfig(
-            extraction_strategy=llm_strategy,
-            cache_mode=CacheMode.BYPASS,
-            remove_overlay_elements=True,
-            remove_forms=True,
-            only_text=True,  # Focus on text content only
-            exclude_external_links=True,  # Remove external navigation
-            exclude_social_media_links=True,  # Remove social media buttons
-        )#
+        if not result.success or not result.markdown:
+            logger.warning("Crawl failed for %s", url)
+            return ""
         
-        async with AsyncWebCrawler(config=BrowserConfig(headless=True,verbose=True)) as crawler:
-            result = await crawler.arun(url=url, config=config)
-            
-            if result.success and result.extracted_content:
-                # LLM extraction only - works across all website types
-                
-                # Return extracted content
-                return self._parse_extraction_result(result.extracted_content)
-            else:
-                logger.warning(f"LLM extraction failed for {url}")
-                return ""
+        # BM25-kept sections when the filter found any, else the whole page; capped either way
+        page_text = result.markdown.fit_markdown or result.markdown.raw_markdown
+        page_text = _collapse_whitespace(page_text)[:SUMMARY_INPUT_MAX_CHARS]
+        if not page_text:
+            logger.warning("No page text extracted from %s", url)
+            return ""
+        
+        response = await fireworks.client.ChatCompletion.acreate(
+            model=self.small_model,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTION},
+                {"role": "user", "content": page_text},
+            ],
+            max_tokens=150,
+            temperature=0.1,
+            response_format={"type": "json_object", "schema": COMPANY_SUMMARY_SCHEMA},
+        )
+        return self._parse_extraction_result(response.choices[0].message.content)
 
 
     def _parse_extraction_result(self, extracted_content: str) -> str:
         """Parse extraction result to get summary"""
         try:
-            content_data = json.loads(extracted_content)
+            content_data = orjson.loads(extracted_content)
             
             if isinstance(content_data, dict) and "summary" in content_data:
                 return content_data["summary"]
@@ -232,206 +479,330 @@ Return ONLY valid JSON:
             logger.warning("No summary found in extraction result")
             return "No summary extracted"
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse extraction result: {e}")
+        except orjson.JSONDecodeError as e:
+            logger.error("Failed to parse extraction result: %s", e)
             return "Failed to parse extraction result"
 
+    async def _complete(self, user: str, max_tokens: int) -> str:
+        """One Fireworks chat completion with the shared system prompt; logs token usage"""
+        # Native async client call: no worker thread per request
+        response = await fireworks.client.ChatCompletion.acreate(
+            model=self.large_model,
+            messages=[
+                {"role": "system", "content": self._system_prompt},
+                {"role": "user", "content": user},
+            ],
+            max_tokens=max_tokens,
+            temperature=0.1,
+            response_format={"type": "json_object"},
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            logger.info("Token usage: prompt=%s completion=%s", usage.prompt_tokens, usage.completion_tokens)
+        return response.choices[0].message.content
+
     @backoff.on_exception(backoff.expo, Exception, max_tries=3)
-    def generate_content(self, prompt: str) -> tuple[str, str]:
+    async def generate_content(self, prompt: str) -> tuple[str, str]:
         """Generate LinkedIn request and email content with retry logic."""
         try:
-            self._apply_rate_limit()
+            await self._apply_rate_limit()
             
-            response = fireworks.client.ChatCompletion.create(
-                model="accounts/fireworks/models/deepseek-v3",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=400,
-                temperature=0.1,
-            )
-            
-            generated_text = response.choices[0].message.content
-            print("summary is: ", generated_text)
+            generated_text = await self._complete(prompt, max_tokens=400)
             return self._parse_generated_content(generated_text)
             
         except Exception as e:
-            logger.error(f"Error generating content: {e}")
+            logger.error("Error generating content: %s", e)
             raise
 
-    def _extract_json_from_markdown(self, text: str) -> str:
-        """Extract JSON content from markdown code blocks."""
+    @backoff.on_exception(backoff.expo, Exception, max_tries=3)
+    async def generate_content_batch(self, prompts: List[str]) -> List[Union[tuple[str, str], Exception]]:
+        """Generate content for several rows in one request; the model returns one JSON object per prompt.
+        
+        A row missing from the batched response is regenerated on its own. If that fails, the
+        exception is returned in the row's slot; raising it would make backoff re-send the whole batch.
+        """
+        if len(prompts) == 1:
+            return [await self._generate_alone(prompts[0])]
+        
+        requests_text = "\n\n".join(f"### Request {i}:\n{prompt}" for i, prompt in enumerate(prompts))
+        batch_prompt = (
+            f"Answer each of the {len(prompts)} requests below. Return ONLY a JSON object of the form "
+            f'{{"results": [...]}} where element i is the JSON object for request i.\n\n{requests_text}'
+        )
         try:
-            # Try to extract JSON from ```json code blocks
-            json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
-            if json_match:
-                return json_match.group(1).strip()
-            
-            # Fallback: try to extract from any ``` code blocks
-            code_match = re.search(r'```\s*(.*?)\s*```', text, re.DOTALL)
-            if code_match:
-                return code_match.group(1).strip()
-            
-            # If no code blocks found, return the original text
-            return text.strip()
+            await self._apply_rate_limit()
             
+            generated_text = await self._complete(batch_prompt, max_tokens=400 * len(prompts))
+        except Exception as e:
+            logger.error("Error generating batched content: %s", e)
+            raise
+        
+        try:
+            data = _loads_json(generated_text)
+            items = data.get("results", []) if isinstance(data, dict) else data
+        except orjson.JSONDecodeError as e:
+            logger.error("Error parsing batched JSON response: %s", e)
+            items = []
+        if not isinstance(items, list):
+            items = []
+        
+        results = []
+        for i, prompt in enumerate(prompts):
+            item = items[i] if i < len(items) else None
+            if isinstance(item, dict):
+                results.append(self._content_from_data(item))
+            else:
+                logger.warning("Request %s missing from batched response, generating it alone", i)
+                results.append(await self._generate_alone(prompt))
+        return results
+
+    async def _generate_alone(self, prompt: str) -> Union[tuple[str, str], Exception]:
+        """generate_content with its own retries, returning the final error instead of raising it"""
+        try:
+            return await self.generate_content(prompt)
+        except Exception as e:
+            return e
+
+    async def generate(self, prompt: str) -> tuple[str, str]:
+        """Queue a prompt for the batcher and wait for its result"""
+        if self._gen_worker is None:
+            self._gen_worker = asyncio.create_task(self._generation_worker())
+        future = asyncio.get_running_loop().create_future()
+        await self._gen_queue.put((prompt, future))
+        return await future
+
+    async def _generation_worker(self) -> None:
+        """Collect queued prompts into batches of up to GENERATION_BATCH_SIZE"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._gen_queue.get()]
+            deadline = loop.time() + GENERATION_BATCH_WINDOW
+            while len(batch) < GENERATION_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._gen_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Run the batch in the background so the next one can start filling
+            task = asyncio.create_task(self._run_generation_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_generation_batch(self, batch: List[tuple]) -> None:
+        """Generate a batch and resolve each row's future"""
+        try:
+            results = await self.generate_content_batch([prompt for prompt, _ in batch])
         except Exception as e:
-            logger.warning(f"Error extracting JSON from markdown: {e}")
-            return text.strip()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _content_from_data(self, data: Dict[str, str]) -> tuple[str, str]:
+        """LinkedIn request and full email (subject + body) from one parsed JSON object"""
+        linkedin_request = data.get("linkedin_request", "Failed to parse LinkedIn request")
+        email_subject = data.get("email_subject", "")
+        email_body = data.get("email_body", "")
+        
+        # Combine subject and body
+        email_full = f"Subject: {email_subject}\n\n{email_body}" if email_subject else email_body
+        return linkedin_request, email_full
 
     def _parse_generated_content(self, generated_text: str) -> tuple[str, str]:
         """Parse JSON generated content to extract LinkedIn request and email."""
         try:
-            # First extract JSON from markdown code blocks
-            json_text = self._extract_json_from_markdown(generated_text)
-            
-            # Parse JSON response
-            data = json.loads(json_text)
-            
-            linkedin_request = data.get("linkedin_request", "Failed to parse LinkedIn request")
-            email_subject = data.get("email_subject", "")
-            email_body = data.get("email_body", "")
-            
-            # Combine subject and body
-            email_full = f"Subject: {email_subject}\n\n{email_body}" if email_subject else email_body
+            # JSON mode returns a bare object, no markdown fences
+            data = _loads_json(generated_text)
             
+            return self._content_from_data(data)
             
-            return linkedin_request, email_full
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON response: {e}")
-            logger.debug(f"Attempted to parse: {json_text[:200]}...")
+        except orjson.JSONDecodeError as e:
+            logger.error("Error parsing JSON response: %s", e)
+            logger.debug("Attempted to parse: %s...", generated_text[:200])
             return "Failed to parse JSON response", "Failed to parse JSON response"
         except Exception as e:
-            logger.error(f"Error parsing generated content: {e}")
+            logger.error("Error parsing generated content: %s", e)
             return "Failed to parse LinkedIn request", "Failed to parse email"
 
 
-    async def process_row(self, index: int, row: pd.Series, resume_content: str) -> Dict[str, str]:
-        """Process a single row with comprehensive error handling."""
+    async def get_company_info(self, company_name: str, company_website: str) -> str:
+        """Company summary from the cache or a fresh scrape; "" when none is available"""
+        if not str(company_name).strip():
+            # Without a name there is no company cache key; only the URL-level cache applies
+            if not company_website:
+                logger.warning("Lead has neither a company name nor a website")
+                return ""
+            summary, _ = await self.scrape_url_cached(company_website)
+            return "" if summary in FAILED_SUMMARIES else summary
+        
+        company_info = self._get_company_info(company_name, company_website)
+        if company_info is not None:
+            logger.info("Using cached info for %s", company_name)
+            return company_info
+        if not company_website:
+            logger.warning("No company website provided for %s", company_name)
+            return ""
+        logger.info("Scraping new company: %s", company_name)
+        return await self._fetch_company_info(company_name, company_website)
+
+    async def process_row(self, index: int, row: Dict, company_info: Union[str, BaseException]) -> Dict[str, str]:
+        """Generate outreach for one row from its company's already-resolved info."""
         try:
-            logger.info(f"Processing row {index}: {row.get('First Name', '')} {row.get('Last Name', '')}")
+            logger.info("Processing row %s: %s %s", index, row.get('First Name', ''), row.get('Last Name', ''))
             
-            # Extract data
-            company_website = row.get("Website", "")
             company_name = row.get("Company Name", "")
             
             # Skip person information gathering to save API costs
             lead_info = ""
             
-            # Get company information (with caching)
-            if company_name in self.company_cache:
-                logger.info(f"Using cached info for {company_name}")
-                company_info = self.company_cache[company_name]
-            else:
-                if company_website:
-                    logger.info(f"Scraping new company: {company_name}")
-                    company_info = await self.scrape_url(company_website)
-                    if company_info and company_info != "No summary extracted":
-                        self.company_cache[company_name] = company_info
-                        self.save_company_cache()
-                else:
-                    logger.warning(f"Row {index}: No company website provided")
-                    company_info = ""
+            # A failed company lookup fails every row at that company
+            if isinstance(company_info, BaseException):
+                raise company_info
             
             # Check if we have company content
             if not company_info.strip():
-                logger.warning(f"Row {index}: No company info available, skipping LLM generation")
+                logger.warning("Row %s: No company info available, skipping LLM generation", index)
                 return {"LinkedIn Request": "No company info available", "Cold Email": "No company info available"}
             
             # Generate content
             prompt = self.get_prompt(
-                resume=resume_content,
                 lead_title=row.get("Lead Title", ""),
                 company_name=company_name,
                 company_info=company_info
             )
             
-            linkedin_request, email_full = self.generate_content(prompt)
-            print(linkedin_request)
-            print(email_full)
-            logger.info(f"✅ Successfully processed row {index}")
+            linkedin_request, email_full = await self.generate(prompt)
+            logger.info("✅ Successfully processed row %s", index)
             return {"LinkedIn Request": linkedin_request, "Cold Email": email_full}
             
         except Exception as e:
-            logger.error(f"Error processing row {index}: {e}")
+            logger.error("Error processing row %s: %s", index, e)
             return {"LinkedIn Request": f"Error: {str(e)}", "Cold Email": f"Error: {str(e)}"}
 
     async def process_excel_file(self, input_file: str, resume_file: str, output_file: str = None) -> None:
         """Main processing function with improved error handling and progress tracking."""
-        print("  Starting Excel file processing...")
         if output_file is None:
             output_file = f"output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        print(f"  Output will be saved to: {output_file}")
+        logger.info("Output will be saved to: %s", output_file)
         
         try:
             # Load input files
-            logger.info(f"Loading input files...")
-            df = pd.read_excel(input_file)
-            logger.info(f"Loaded {len(df)} rows from Excel file")
+            logger.info("Loading input files...")
+            df = pd.read_excel(input_file, engine="calamine")
+            logger.info("Loaded %s rows from Excel file", len(df))
             
             with open(resume_file, "r", encoding='utf-8') as f:
                 resume_content = f.read()
+            self.set_resume(resume_content)
             logger.info("Resume loaded successfully")
             
             # Validate DataFrame columns
             required_columns = ["Company Name"]
 
             
-            # Add new columns for generated content
-            df["LinkedIn Request"] = ""
-            df["Cold Email"] = ""
-            df["Processing Status"] = ""
-            df["Processed At"] = ""
+            # One result dict per row position, assigned as whole columns at the end
+            results: List[Optional[Dict[str, str]]] = [None] * len(df)
             
-            # Process each row
-            successful_rows = 0
-            failed_rows = 0
+            sem = asyncio.Semaphore(self.max_concurrency)
             
-            for index, row in df.iterrows():
-                try:
-                    result = await self.process_row(index, row, resume_content)
-                    
-                    # Update DataFrame
-                    df.at[index, "LinkedIn Request"] = result["LinkedIn Request"]
-                    df.at[index, "Cold Email"] = result["Cold Email"]
-                    df.at[index, "Processing Status"] = "Success" if not result["LinkedIn Request"].startswith("Error") else "Failed"
-                    df.at[index, "Processed At"] = datetime.now().isoformat()
-                    
-                    if result["LinkedIn Request"].startswith("Error"):
-                        failed_rows += 1
-                    else:
-                        successful_rows += 1
-                    
-                    # Save progress periodically
-                    if (index + 1) % 5 == 0:
-                        df.to_excel(output_file, index=False)
-                        logger.info(f"Progress saved: {index + 1}/{len(df)} rows processed")
-                    
-                    # Rate limiting between rows
-                    await asyncio.sleep(1)
+            # Resolve each company once, then fan its summary out to all of its contacts
+            # Keyed by (name, website) so leads with a blank company name aren't merged into one "company"
+            companies = list(df.reindex(columns=["Company Name", "Website"]).fillna("").itertuples(index=False, name=None))
+            unique_companies = list(dict.fromkeys(companies))
+            logger.info("%s unique companies across %s rows", len(unique_companies), len(df))
+            
+            async def _bounded_company(company_name, website):
+                async with sem:
+                    return await self.get_company_info(company_name, website)
+            
+            company_infos = await asyncio.gather(
+                *(_bounded_company(name, website) for name, website in unique_companies),
+                return_exceptions=True,
+            )
+            company_info_map = dict(zip(unique_companies, company_infos))
+            row_company_infos = [company_info_map[company] for company in companies]
+            
+            # Process rows concurrently; _apply_rate_limit paces the API calls
+            completed_rows = 0
+            
+            progress_lock = asyncio.Lock()
+            
+            async def _bounded(pos, index, row):
+                nonlocal completed_rows
+                async with sem:
+                    result = await self.process_row(index, row, row_company_infos[pos])
+                    results[pos] = {
+                        "LinkedIn Request": result["LinkedIn Request"],
+                        "Cold Email": result["Cold Email"],
+                        "Processing Status": "Failed" if result["LinkedIn Request"].startswith("Error") else "Success",
+                        "Processed At": datetime.now().isoformat(),
+                    }
                     
-                except Exception as e:
-                    logger.error(f"Fatal error processing row {index}: {e}")
-                    df.at[index, "Processing Status"] = f"Fatal Error: {str(e)}"
-                    df.at[index, "Processed At"] = datetime.now().isoformat()
-                    failed_rows += 1
+                    completed_rows += 1
+                    checkpoint = completed_rows % PROGRESS_SAVE_EVERY == 0
+                
+                # Checkpoint finished rows to Parquet outside the semaphore; the workbook is written once at the end
+                if checkpoint:
+                    snapshot = [{"Row": i, **r} for i, r in enumerate(results) if r is not None]
+                    try:
+                        async with progress_lock:
+                            await asyncio.to_thread(_write_progress, snapshot)
+                        logger.info("Progress saved: %s/%s rows processed", len(snapshot), len(df))
+                    except Exception as e:
+                        logger.warning("Could not write %s: %s", PROGRESS_FILE, e)
+            
+            # Plain dicts, converted in one pass, instead of a Series built per row by iterrows()
+            records = df.to_dict("records")
+            outcomes = await asyncio.gather(
+                *(_bounded(pos, index, row) for pos, (index, row) in enumerate(zip(df.index, records))),
+                return_exceptions=True,
+            )
+            for pos, (index, outcome) in enumerate(zip(df.index, outcomes)):
+                if isinstance(outcome, Exception):
+                    logger.error("Fatal error processing row %s: %s", index, outcome)
+                    results[pos] = {
+                        "LinkedIn Request": "",
+                        "Cold Email": "",
+                        "Processing Status": f"Fatal Error: {str(outcome)}",
+                        "Processed At": datetime.now().isoformat(),
+                    }
+            
+            successful_rows = sum(r["Processing Status"] == "Success" for r in results)
+            failed_rows = len(df) - successful_rows
+            df = df.assign(**{col: [r[col] for r in results] for col in RESULT_COLUMNS})
             
             # Final save
-            df.to_excel(output_file, index=False)
-            self.save_company_cache()  # Final cache save
+            df.to_excel(output_file, index=False, engine="xlsxwriter")
             
             # Summary
-            logger.info(f"""
+            logger.info("""
             Processing complete! 
-            - Total rows: {len(df)}
-            - Successful: {successful_rows}
-            - Failed: {failed_rows}
-            - Output saved to: {output_file}
-            - Company cache: {len(self.company_cache)} companies
-            """)
+            - Total rows: %s
+            - Successful: %s
+            - Failed: %s
+            - Output saved to: %s
+            - Company cache: %s companies
+            """, len(df), successful_rows, failed_rows, output_file, len(self.company_cache))
             
         except Exception as e:
-            logger.error(f"Fatal error in main processing: {e}")
+            logger.error("Fatal error in main processing: %s", e)
             raise
+        finally:
+            # Let background refreshes land before the snapshot
+            if self._refresh_tasks:
+                await asyncio.gather(*self._refresh_tasks.values(), return_exceptions=True)
+            self.save_company_cache()  # Final cache snapshot
+            self.save_url_cache()
+            await self.close()
 
 async def main():
     """Main function with configuration and error handling."""
@@ -467,7 +838,7 @@ async def main():
         
     except Exception as e:
         print(f"❌ ERROR: {e}")
-        logger.error(f"Application failed: {e}")
+        logger.error("Application failed: %s", e)
         import traceback
         traceback.print_exc()
         raise